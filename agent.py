@@ -9,10 +9,17 @@ This module implements the core agent infrastructure with:
 - Session handling
 """
 
+import atexit
+import functools
+import heapq
 import os
-import json
+import re
 import asyncio
-from typing import Dict, List, Any, Optional, Callable
+import uuid
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from itertools import chain, islice
+from typing import AsyncIterator, Awaitable, Deque, Dict, FrozenSet, List, Any, Optional, Callable, Set
 from dataclasses import dataclass, field
 from datetime import datetime
 from pathlib import Path
@@ -21,28 +28,134 @@ from google import genai
 from google.genai import types
 from pydantic import BaseModel
 
-# Load environment variables
-from dotenv import load_dotenv
-load_dotenv()
+from embeddings import (
+    EMBED_BATCH_SIZE, EMBEDDINGS_AVAILABLE, EMBEDDING_FORMAT, SessionIndex, VectorIndex,
+    decode_vectors, embed_query, embed_texts, encode_vector
+)
+from memory_writer import (
+    AsyncMemoryWriter, append_jsonl, atomic_write_bytes, dump_jsonl, load_json, load_jsonl
+)
+from config import get_api_key
+from response_cache import ResponseCache, hash_key
 
+try:
+    from rank_bm25 import BM25Okapi
+    BM25_AVAILABLE = True
+except ImportError:
+    BM25_AVAILABLE = False
 
-@dataclass
+# Reciprocal Rank Fusion constant and per-ranker candidate depth for memory search
+RRF_K = 60
+RRF_CANDIDATES = 50
+
+_TOKEN_RE = re.compile(r"\w+")
+
+# Caps on in-flight Gemini requests (across all agents) and tool calls per turn
+MAX_CONCURRENT_REQUESTS = int(os.getenv("AGENT_MAX_CONCURRENT_REQUESTS", "4"))
+MAX_PARALLEL_TOOLS = 5
+
+# Seconds to keep the system instruction and tool declarations in a Gemini
+# context cache; 0 (the default) sends them with every request instead.
+# Gemini only caches content above a model-specific minimum token count
+CONTEXT_CACHE_TTL = int(os.getenv("AGENT_CONTEXT_CACHE_TTL", "0"))
+
+# Semantic search first narrows memory to this many best-matching sessions
+SESSION_SEARCH_LIMIT = 5
+
+_request_semaphore = asyncio.Semaphore(MAX_CONCURRENT_REQUESTS)
+
+# Tools block (PyMOL, GUI automation, file I/O), so they run on one persistent,
+# bounded pool shared by every agent rather than on the loop's default executor
+_tool_executor = ThreadPoolExecutor(max_workers=MAX_PARALLEL_TOOLS, thread_name_prefix="agent-tool")
+atexit.register(_tool_executor.shutdown, wait=False)
+
+# Marks the end of a streamed response on the chunk queue
+_STREAM_END = object()
+
+
+def _tokenize(text: str) -> List[str]:
+    """Split text into lowercase word tokens for lexical search."""
+    return _TOKEN_RE.findall(text.lower())
+
+
+@dataclass(slots=True)
 class MemoryItem:
-    """Represents a single memory item with timestamp and content."""
+    """Represents a single memory item with timestamp and content.
+    
+    Slotted to keep per-item overhead low; embeddings live in the vector
+    index and an item only records its `row` there. `memory_id` is stable
+    across processes, so log rows written later can refer to the memory.
+    """
     timestamp: datetime
     content: str
     importance: float = 1.0
     tags: List[str] = field(default_factory=list)
+    session_id: str = ""
+    memory_id: str = field(default_factory=lambda: uuid.uuid4().hex, compare=False)
+    row: Optional[int] = field(default=None, init=False, repr=False, compare=False)
+    _tokens: FrozenSet[str] = field(init=False, repr=False, compare=False)
+    _time_str: str = field(init=False, repr=False, compare=False)
+    
+    def __post_init__(self):
+        # Tokenize once here so keyword search doesn't re-lowercase per query
+        self._tokens = frozenset(_tokenize(self.content))
+        # Likewise format the context timestamp once rather than on every message
+        self._time_str = self.timestamp.strftime('%H:%M')
+    
+    def to_record(self) -> Dict[str, Any]:
+        """Convert to a JSON-serializable record."""
+        return {
+            'id': self.memory_id,
+            'timestamp': self.timestamp.isoformat(),
+            'content': self.content,
+            'importance': self.importance,
+            'tags': self.tags,
+            'session_id': self.session_id
+        }
+    
+    @classmethod
+    def from_record(cls, record: Dict[str, Any]) -> "MemoryItem":
+        """Build a memory item from a stored record.
+        
+        Records written before memories had ids are given a new one.
+        """
+        item = cls(
+            timestamp=datetime.fromisoformat(record['timestamp']),
+            content=record['content'],
+            importance=record['importance'],
+            tags=record['tags'],
+            session_id=record.get('session_id', "")
+        )
+        if record.get('id'):
+            item.memory_id = record['id']
+        return item
 
 
 class MemorySystem:
     """Manages both short-term and long-term memory for the agent."""
     
-    def __init__(self, max_short_term: int = 10, memory_file: str = "memory.json"):
+    def __init__(self, max_short_term: int = 10, memory_file: str = "memory.jsonl"):
         self.max_short_term = max_short_term
         self.memory_file = Path(memory_file)
-        self.short_term: List[MemoryItem] = []
+        self.short_term: Deque[MemoryItem] = deque(maxlen=max_short_term)
         self.long_term: List[MemoryItem] = []
+        self.session_id = uuid.uuid4().hex
+        self.vector_index = VectorIndex() if EMBEDDINGS_AVAILABLE else None
+        self.session_index = SessionIndex() if EMBEDDINGS_AVAILABLE else None
+        self._bm25 = None
+        self._bm25_items: List[MemoryItem] = []
+        self._bm25_dirty = True
+        # New memories are embedded in batches. Their records are written at once;
+        # a memory saved before its embedding existed gets the vector appended
+        # later as an update row that names the memory by its id
+        self._pending_embed: List[MemoryItem] = []
+        self._vectorless: Set[int] = set()
+        # Batches being embedded off the event loop, and items evicted meanwhile
+        self._embedding: Set[asyncio.Future] = set()
+        self._dropped: Set[int] = set()
+        self._writer = AsyncMemoryWriter(self._write_memory)
+        # Registered after the writer's own hook, so it runs first at exit
+        atexit.register(self.flush)
         self._load_memory()
     
     def add_short_term(self, content: str, importance: float = 1.0, tags: List[str] = None):
@@ -51,18 +164,29 @@ class MemorySystem:
             timestamp=datetime.now(),
             content=content,
             importance=importance,
-            tags=tags or []
+            tags=tags or [],
+            session_id=self.session_id
         )
+        # The deque drops its oldest item on append once full
+        oldest = self.short_term[0] if len(self.short_term) == self.max_short_term else None
         self.short_term.append(item)
+        self._queue_embedding(item)
+        self._bm25_dirty = True
         
-        # Keep only recent items in short-term memory
-        if len(self.short_term) > self.max_short_term:
-            # Move oldest items to long-term if important enough
-            oldest = self.short_term.pop(0)
+        if oldest is not None:
+            # Move evicted items to long-term if important enough
             if oldest.importance >= 0.7:
                 self.long_term.append(oldest)
-        
-        self._save_memory()
+                self._save_memory(oldest)
+            elif self.vector_index is not None:
+                vector = self.vector_index.get_vector(oldest)
+                if vector is not None:
+                    self.session_index.discard(oldest.session_id, oldest.row, vector)
+                self.vector_index.discard(oldest)
+                self._pending_embed = [mem for mem in self._pending_embed if mem is not oldest]
+                if self._embedding:
+                    # It may be in a batch still being embedded; skip it when that lands
+                    self._dropped.add(id(oldest))
     
     def add_long_term(self, content: str, importance: float = 1.0, tags: List[str] = None):
         """Add item directly to long-term memory."""
@@ -70,65 +194,293 @@ class MemorySystem:
             timestamp=datetime.now(),
             content=content,
             importance=importance,
-            tags=tags or []
+            tags=tags or [],
+            session_id=self.session_id
         )
         self.long_term.append(item)
-        self._save_memory()
+        self._queue_embedding(item)
+        self._bm25_dirty = True
+        self._save_memory(item)
     
     def search_memory(self, query: str, limit: int = 5) -> List[MemoryItem]:
-        """Search through both memory types for relevant content."""
-        all_memories = self.short_term + self.long_term
+        """Search through both memory types for relevant content.
+        
+        Lexical (BM25) and semantic rankings are merged with Reciprocal Rank
+        Fusion, so exact tokens like PDB IDs and paraphrased questions both match.
+        """
+        if not query.strip():
+            return []
         
-        # Simple keyword matching - can be enhanced with embeddings
-        relevant = [mem for mem in all_memories 
-                   if any(word.lower() in mem.content.lower() 
-                         for word in query.split())]
+        rankings = [self._lexical_search(query, RRF_CANDIDATES),
+                    self._semantic_search(query, RRF_CANDIDATES)]
         
-        return sorted(relevant, key=lambda x: x.importance, reverse=True)[:limit]
+        scores: Dict[int, float] = {}
+        memories: Dict[int, MemoryItem] = {}
+        for ranking in rankings:
+            for rank, mem in enumerate(ranking, 1):
+                scores[id(mem)] = scores.get(id(mem), 0.0) + 1.0 / (RRF_K + rank)
+                memories[id(mem)] = mem
+        
+        best = sorted(scores, key=scores.get, reverse=True)[:limit]
+        return [memories[key] for key in best]
+    
+    def _lexical_search(self, query: str, limit: int) -> List[MemoryItem]:
+        """Rank memories by BM25, or by importance among keyword matches."""
+        if BM25_AVAILABLE:
+            if self._bm25_dirty:
+                self._bm25_items = list(self.short_term) + self.long_term
+                self._bm25 = (BM25Okapi([_tokenize(mem.content) for mem in self._bm25_items])
+                              if self._bm25_items else None)
+                self._bm25_dirty = False
+            
+            query_tokens = _tokenize(query)
+            if self._bm25 is None or not query_tokens:
+                return []
+            
+            scores = self._bm25.get_scores(query_tokens)
+            ranked = heapq.nlargest(limit, range(len(scores)), key=scores.__getitem__)
+            return [self._bm25_items[i] for i in ranked if scores[i] > 0]
+        
+        # Keyword matching fallback when rank_bm25 is unavailable
+        query_tokens = set(_tokenize(query))
+        relevant = [mem for mem in chain(self.short_term, self.long_term)
+                    if query_tokens & mem._tokens]
+        if not relevant:
+            # Partial-word matches (e.g. "ubq" in "1ubq") need a substring scan
+            words = [word.lower() for word in query.split()]
+            relevant = [mem for mem in chain(self.short_term, self.long_term)
+                        if any(word in mem.content.lower() for word in words)]
+        
+        return heapq.nlargest(limit, relevant, key=lambda x: x.importance)
+    
+    def _semantic_search(self, query: str, limit: int) -> List[MemoryItem]:
+        """Rank memories by embedding similarity to the query."""
+        self._embed_pending()
+        if self.vector_index is None or not len(self.vector_index):
+            return []
+        
+        try:
+            query_vector = embed_query(query)
+            
+            rows = None
+            if len(self.session_index) > SESSION_SEARCH_LIMIT:
+                # Two-level search: pick the closest sessions, then score only their items
+                rows = self.session_index.candidate_rows(
+                    query_vector, SESSION_SEARCH_LIMIT, include=self.session_id)
+            
+            return [mem for mem, _ in self.vector_index.search(query_vector, limit, rows=rows)]
+        except Exception as e:
+            print(f"Semantic search failed: {e}")
+            return []
     
     def get_context(self, limit: int = 5) -> str:
         """Get recent context from short-term memory."""
         if not self.short_term:
             return "No previous context."
         
-        context_items = self.short_term[-limit:]
-        return "\n".join([f"[{mem.timestamp.strftime('%H:%M')}] {mem.content}" 
-                         for mem in context_items])
+        start = max(0, len(self.short_term) - limit)
+        return "\n".join(f"[{mem._time_str}] {mem.content}"
+                         for mem in islice(self.short_term, start, None))
     
-    def _load_memory(self):
-        """Load long-term memory from file."""
-        if self.memory_file.exists():
-            try:
-                with open(self.memory_file, 'r') as f:
-                    data = json.load(f)
-                    self.long_term = [
-                        MemoryItem(
-                            timestamp=datetime.fromisoformat(item['timestamp']),
-                            content=item['content'],
-                            importance=item['importance'],
-                            tags=item['tags']
-                        )
-                        for item in data
-                    ]
-            except Exception as e:
-                print(f"Error loading memory: {e}")
+    def _queue_embedding(self, item: MemoryItem):
+        """Queue a new memory for embedding, embedding the queue once it is full.
+        
+        Inside an event loop the full batch is encoded on the loop's default
+        executor, so the model's forward pass doesn't stall other tasks.
+        """
+        if self.vector_index is None:
+            return
+        
+        self._pending_embed.append(item)
+        if len(self._pending_embed) < EMBED_BATCH_SIZE:
+            return
+        
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            self._embed_pending()
+            return
+        
+        items, self._pending_embed = self._pending_embed, []
+        future = loop.run_in_executor(None, embed_texts, [mem.content for mem in items])
+        self._embedding.add(future)
+        future.add_done_callback(functools.partial(self._finish_embedding, items))
     
-    def _save_memory(self):
-        """Save long-term memory to file."""
+    def _finish_embedding(self, items: List[MemoryItem], future: asyncio.Future):
+        """Index a batch embedded off the loop (runs on the loop thread)."""
+        keep = [i for i, mem in enumerate(items) if id(mem) not in self._dropped]
+        self._embedding.discard(future)
+        if not self._embedding:
+            self._dropped.clear()
+        
+        if self.vector_index is None or future.cancelled():
+            return
         try:
-            data = []
-            for mem in self.long_term:
-                data.append({
-                    'timestamp': mem.timestamp.isoformat(),
-                    'content': mem.content,
-                    'importance': mem.importance,
-                    'tags': mem.tags
+            vectors = future.result()
+        except Exception as e:
+            # Degrade to keyword search rather than failing memory writes
+            print(f"Error embedding memory, disabling semantic search: {e}")
+            self.vector_index = None
+            self.session_index = None
+            return
+        
+        if len(keep) != len(items):
+            items, vectors = [items[i] for i in keep], vectors[keep]
+        self._add_vectors(vectors, items)
+        self._save_vectors(items)
+    
+    def _embed_pending(self):
+        """Embed all queued memories in one batch and save vectors that were waiting on it."""
+        items, self._pending_embed = self._pending_embed, []
+        self._index_items(items)
+        self._save_vectors(items)
+    
+    def _save_vectors(self, items: List[MemoryItem]):
+        """Append embedding update rows for memories that were saved without one."""
+        if not self._vectorless or self.vector_index is None:
+            return
+        
+        for mem in items:
+            if id(mem) not in self._vectorless:
+                continue
+            self._vectorless.discard(id(mem))
+            vector = self.vector_index.get_vector(mem)
+            if vector is not None:
+                self._writer.submit({
+                    'embedding_for': mem.memory_id,
+                    'embedding': encode_vector(vector),
+                    'model': EMBEDDING_FORMAT
                 })
+    
+    def _index_items(self, items: List[MemoryItem]):
+        """Embed items and add them to the vector index."""
+        if self.vector_index is None or not items:
+            return
+        
+        try:
+            self._add_vectors(embed_texts([mem.content for mem in items]), items)
+        except Exception as e:
+            # Degrade to keyword search rather than failing memory writes
+            print(f"Error embedding memory, disabling semantic search: {e}")
+            self.vector_index = None
+            self.session_index = None
+    
+    def _add_vectors(self, vectors, items: List[MemoryItem]):
+        """Add embeddings to the vector index and their rows to the session index."""
+        self.vector_index.add(vectors, items)
+        for mem in items:
+            self.session_index.add(mem.session_id, mem.row, self.vector_index.vectors[mem.row])
+    
+    def _load_memory(self):
+        """Load long-term memory from the append-only log."""
+        memory_file = self.memory_file
+        legacy_file = memory_file.with_suffix('.json')
+        if not memory_file.exists() and legacy_file.exists():
+            memory_file = legacy_file
+        
+        if not memory_file.exists():
+            return
+        
+        try:
+            with open(memory_file, 'rb') as f:
+                data = f.read()
             
-            with open(self.memory_file, 'w') as f:
-                json.dump(data, f, indent=2)
+            legacy = data.lstrip().startswith(b'[')
+            if legacy:
+                # Legacy format: a single JSON array rewritten on every save
+                records = [record for record in load_json(data) if isinstance(record, dict)]
+            else:
+                # Torn or malformed lines are skipped, and the log repaired
+                records = load_jsonl(data, memory_file)
         except Exception as e:
-            print(f"Error saving memory: {e}")
+            print(f"Error loading memory: {e}")
+            return
+        
+        # Fold embedding update rows into the memory records they name. Rows
+        # naming no loaded record (including older rows that held a log
+        # position) are dropped, and those memories are embedded again
+        updates = [record for record in records if 'embedding_for' in record]
+        if updates:
+            records = [record for record in records if 'embedding_for' not in record]
+            by_id = {record['id']: record for record in records if record.get('id')}
+            for update in updates:
+                key = update['embedding_for']
+                record = by_id.get(key) if isinstance(key, str) else None
+                if record is not None:
+                    record.update(embedding=update.get('embedding'), model=update.get('model'))
+        unidentified = any(not record.get('id') for record in records)
+        
+        # A malformed record costs only itself, not the rest of the log
+        loaded = []
+        for record in records:
+            try:
+                self.long_term.append(MemoryItem.from_record(record))
+                loaded.append(record)
+            except (KeyError, TypeError, ValueError) as e:
+                print(f"Warning: skipped a malformed memory record: {e}")
+        skipped = len(loaded) != len(records)
+        records = loaded
+        
+        stale = self._index_loaded(records)
+        if stale or legacy or updates or skipped or unidentified or memory_file != self.memory_file:
+            # Rewrite once so the next start loads current embeddings directly
+            atomic_write_bytes(self.memory_file, dump_jsonl(
+                self._memory_record(mem) for mem in self.long_term))
+    
+    def _index_loaded(self, records: List[Dict[str, Any]]) -> bool:
+        """Index loaded memories, reusing stored embeddings in the current format.
+        
+        Returns True if any memory had to be re-embedded.
+        """
+        if self.vector_index is None:
+            return False
+        
+        stored, missing = [], []
+        for mem, record in zip(self.long_term, records):
+            if record.get('embedding') and record.get('model') == EMBEDDING_FORMAT:
+                stored.append((mem, record['embedding']))
+            else:
+                missing.append(mem)
+        
+        if stored:
+            try:
+                vectors = decode_vectors([encoded for _, encoded in stored])
+                self._add_vectors(vectors, [mem for mem, _ in stored])
+            except Exception as e:
+                print(f"Error decoding stored embeddings: {e}")
+                missing = self.long_term
+        
+        self._index_items(missing)
+        return bool(missing) and self.vector_index is not None
+    
+    def _memory_record(self, mem: MemoryItem) -> Dict[str, Any]:
+        """Build the stored record for a memory, including its embedding."""
+        record = mem.to_record()
+        if self.vector_index is not None:
+            vector = self.vector_index.get_vector(mem)
+            if vector is not None:
+                record['embedding'] = encode_vector(vector)
+                record['model'] = EMBEDDING_FORMAT
+        return record
+    
+    def _save_memory(self, mem: MemoryItem):
+        """Queue the newest long-term memory to be appended to the log.
+        
+        The record is written straight away. If the memory isn't embedded yet,
+        its vector follows as an update row once the batch is encoded.
+        """
+        if self.vector_index is not None and mem.row is None:
+            self._vectorless.add(id(mem))
+        self._writer.submit(self._memory_record(mem))
+    
+    def _write_memory(self, records: List[Dict[str, Any]]):
+        """Append records to the memory log, one JSON object per line."""
+        append_jsonl(self.memory_file, records)
+    
+    def flush(self):
+        """Embed queued memories and block until all memory writes are on disk."""
+        self._embed_pending()
+        self._writer.flush()
 
 
 class ToolRegistry:
@@ -137,10 +489,26 @@ class ToolRegistry:
     def __init__(self):
         self.tools: Dict[str, Callable] = {}
         self.tool_declarations: List[Dict] = []
+        # Tools that change shared application state, so their calls must run in order
+        self.ordered_tools: Set[str] = set()
+        # Bumped on every registration so callers can tell when cached configs are stale
+        self.version = 0
+        self._tools_config: Optional[List[types.Tool]] = None
     
-    def register_tool(self, name: str, func: Callable, description: str = None):
-        """Register a tool with the agent."""
+    def register_tool(self, name: str, func: Callable, description: str = None,
+                      ordered: bool = False):
+        """Register a tool with the agent.
+        
+        Calls to ordered tools run one at a time, in the order the model made
+        them; calls to other tools may run concurrently.
+        """
         self.tools[name] = func
+        if ordered:
+            self.ordered_tools.add(name)
+        else:
+            self.ordered_tools.discard(name)
+        self.version += 1
+        self._tools_config = None
         
         # Auto-generate function declaration from function
         if hasattr(func, '__doc__') and description is None:
@@ -162,24 +530,77 @@ class ToolRegistry:
             "required": []
         }
     
+    def dispatch(self, name: str, args: Optional[Dict[str, Any]] = None) -> Any:
+        """Call a registered tool by name with the model-supplied arguments."""
+        func = self.tools[name]
+        return func(**args) if args else func()
+    
     def get_tools_config(self) -> List[types.Tool]:
-        """Get tools configuration for Gemini API."""
-        return [types.Tool(function_declarations=[decl]) 
-                for decl in self.tool_declarations]
+        """Get tools configuration for Gemini API, built once per registration change."""
+        if self._tools_config is None:
+            self._tools_config = [types.Tool(function_declarations=[decl]) 
+                                  for decl in self.tool_declarations]
+        return self._tools_config
+
+
+class ToolCallBatch:
+    """Runs the tool calls from one model turn.
+    
+    Calls to unordered tools run concurrently (at most MAX_PARALLEL_TOOLS
+    at once). A call to an ordered tool waits for every earlier call and
+    holds back every later one, so dependent steps like load-then-color
+    happen in the order the model asked for them.
+    """
+    
+    def __init__(self, run_tool: Callable[[Any, asyncio.Semaphore], Awaitable[Any]],
+                 ordered_tools: Set[str]):
+        self._run_tool = run_tool
+        self._ordered_tools = ordered_tools
+        self._semaphore = asyncio.Semaphore(MAX_PARALLEL_TOOLS)
+        self._tasks: List[asyncio.Future] = []
+        self._barrier: Optional[asyncio.Future] = None
+        self.calls = []
+    
+    def submit(self, call):
+        """Start a tool call as soon as the calls it depends on have finished."""
+        if call.name in self._ordered_tools:
+            after = list(self._tasks)
+        else:
+            after = [self._barrier] if self._barrier is not None else []
+        
+        task = asyncio.ensure_future(self._run_after(after, call))
+        if call.name in self._ordered_tools:
+            self._barrier = task
+        self._tasks.append(task)
+        self.calls.append(call)
+    
+    async def _run_after(self, after: List[asyncio.Future], call) -> Any:
+        # _run_tool reports failures as results, so waiting here never raises
+        if after:
+            await asyncio.wait(after)
+        return await self._run_tool(call, self._semaphore)
+    
+    async def results(self) -> List[Any]:
+        """Wait for every submitted call and return their results in call order."""
+        return list(await asyncio.gather(*self._tasks))
+
+
+@functools.lru_cache(maxsize=4)
+def _get_client(api_key: str) -> genai.Client:
+    """Return a Gemini client for the key, shared by every agent that uses it."""
+    return genai.Client(api_key=api_key)
 
 
 class PyMOLAgent:
     """Main PyMOL Learning Agent with orchestration capabilities."""
     
-    def __init__(self, api_key: str = None, model: str = "gemini-2.5-pro"):
+    def __init__(self, api_key: str = None, model: str = "gemini-2.5-pro",
+                 cache_responses: bool = True):
         # Check for API key in multiple environment variables (google-genai supports both)
         # The google-genai library can read from GOOGLE_API_KEY automatically, but we'll
         # explicitly pass it to ensure it's used correctly
-        self.api_key = api_key or os.getenv("GEMINI_API_KEY") or os.getenv("GOOGLE_API_KEY")
-        
-        # Strip whitespace that might be in .env file
-        if self.api_key:
-            self.api_key = self.api_key.strip()
+        # Whitespace that might be in the .env file is stripped either way
+        self.api_key = api_key.strip() if api_key else get_api_key()
         
         if not self.api_key:
             raise ValueError("GEMINI_API_KEY or GOOGLE_API_KEY environment variable is required")
@@ -198,7 +619,7 @@ class PyMOLAgent:
         os.environ["GOOGLE_API_KEY"] = self.api_key
         
         try:
-            self.client = genai.Client(api_key=self.api_key)
+            self.client = _get_client(self.api_key)
         except Exception as e:
             error_str = str(e)
             # Provide detailed error information
@@ -240,8 +661,15 @@ class PyMOLAgent:
             raise ValueError(error_details) from e
         self.model = model
         self.memory = MemorySystem()
+        self.response_cache = (
+            ResponseCache(str(self.memory.memory_file.with_name("response_cache.jsonl")))
+            if cache_responses else None
+        )
         self.tool_registry = ToolRegistry()
         self.session_history = []
+        self._base_config: Optional[types.GenerateContentConfig] = None
+        self._config_cache: Dict[float, types.GenerateContentConfig] = {}
+        self._config_signature = None
         
         # System instruction for the agent
         self.system_instruction = """
@@ -277,32 +705,23 @@ class PyMOLAgent:
             "Echo a message for testing purposes"
         )
     
-    async def process_message(self, message: str, temperature: float = 0.1) -> str:
-        """Process a user message and generate response."""
-        # Add to memory
-        self.memory.add_short_term(f"User: {message}", importance=0.8)
-        
-        # Get context
-        context = self.memory.get_context()
+    async def process_message(self, message: str, temperature: float = 0.1,
+                              stateless: bool = False) -> str:
+        """Process a user message and generate response.
         
-        # Prepare content
-        contents = [
-            types.Content(
-                role="user", 
-                parts=[types.Part(text=f"Context:\n{context}\n\nUser message: {message}")]
-            )
-        ]
+        A stateless message is sent without the recent conversation as
+        context, so its cached answer is reused whatever came before it.
+        """
+        cache_scope, cached, contents = self._begin_turn(message, temperature, stateless)
+        if cached is not None:
+            return cached
         
         # Configure generation
-        config = types.GenerateContentConfig(
-            temperature=temperature,
-            system_instruction=self.system_instruction,
-            tools=self.tool_registry.get_tools_config()
-        )
+        config = self._generation_config(temperature)
         
         try:
             # Generate response
-            response = self.client.models.generate_content(
+            response = await self._generate_content(
                 model=self.model,
                 contents=contents,
                 config=config
@@ -318,28 +737,217 @@ class PyMOLAgent:
             # Add to memory
             self.memory.add_short_term(f"Agent: {response_text}", importance=0.9)
             
+            # Only plain-text answers are cached; tool calls have side effects to replay
+            if self.response_cache is not None and response_text:
+                self.response_cache.put(cache_scope, message, response_text)
+            
             return response_text
             
         except Exception as e:
-            error_str = str(e)
-            # Provide helpful error messages for common API key issues
-            if "API key expired" in error_str or "API_KEY_INVALID" in error_str:
-                error_msg = (
-                    f"❌ API Key Error: {error_str}\n\n"
-                    "This usually means:\n"
-                    "1. Your API key has expired - get a new one from https://aistudio.google.com/apikey\n"
-                    "2. Your API key is invalid - verify it's correct in your .env file\n"
-                    "3. Your API key doesn't have the required permissions\n\n"
-                    "To fix:\n"
-                    "- Visit https://aistudio.google.com/apikey to create/renew your API key\n"
-                    "- Update your .env file with: GEMINI_API_KEY=your_new_key_here\n"
-                    "- Make sure the key starts with 'AIza'"
+            return self._record_error(e)
+    
+    async def stream_message(self, message: str, temperature: float = 0.1) -> AsyncIterator[str]:
+        """Process a user message, yielding response text as it is generated.
+        
+        Tool calls start running as soon as the model emits them, while the
+        rest of the response is still streaming; the follow-up answer that
+        uses their results is streamed as well.
+        """
+        cache_scope, cached, contents = self._begin_turn(message, temperature)
+        if cached is not None:
+            yield cached
+            return
+        
+        text_parts: List[str] = []
+        try:
+            model_parts = []
+            tool_batch = self._tool_batch()
+            
+            async for chunk in self._stream_content(
+                model=self.model,
+                contents=contents,
+                config=self._generation_config(temperature)
+            ):
+                for part in self._chunk_parts(chunk):
+                    model_parts.append(part)
+                    if part.function_call:
+                        if part.function_call.name in self.tool_registry.tools:
+                            tool_batch.submit(part.function_call)
+                    elif part.text and not part.thought:
+                        text_parts.append(part.text)
+                        yield part.text
+            
+            function_calls = tool_batch.calls
+            if function_calls:
+                outcomes = await tool_batch.results()
+                contents.append(types.Content(role="model", parts=model_parts))
+                contents.append(types.Content(
+                    role="user", parts=self._function_response_parts(function_calls, outcomes)))
+                
+                async for chunk in self._stream_content(
+                    model=self.model,
+                    contents=contents,
+                    config=self._generation_config(0.1)
+                ):
+                    for part in self._chunk_parts(chunk):
+                        if part.text and not part.thought:
+                            text_parts.append(part.text)
+                            yield part.text
+            
+            response_text = "".join(text_parts)
+            self.memory.add_short_term(f"Agent: {response_text}", importance=0.9)
+            
+            if self.response_cache is not None and response_text and not function_calls:
+                self.response_cache.put(cache_scope, message, response_text)
+            
+        except Exception as e:
+            error_msg = self._record_error(e)
+            yield f"\n{error_msg}" if text_parts else error_msg
+    
+    def _begin_turn(self, message: str, temperature: float, stateless: bool = False):
+        """Record the user message; return the cache scope, a cached answer and the contents."""
+        # Look up the cache before this message changes the conversation state
+        cache_scope = self._cache_scope(temperature, stateless)
+        cached = self.response_cache.get(cache_scope, message) if self.response_cache else None
+        
+        # Add to memory
+        self.memory.add_short_term(f"User: {message}", importance=0.8)
+        
+        if cached is not None:
+            self.memory.add_short_term(f"Agent: {cached}", importance=0.9)
+            return cache_scope, cached, None
+        
+        # Get context
+        context = "No previous context." if stateless else self.memory.get_context()
+        
+        # Prepare content
+        contents = [
+            types.Content(
+                role="user", 
+                parts=[types.Part(text=f"Context:\n{context}\n\nUser message: {message}")]
+            )
+        ]
+        return cache_scope, None, contents
+    
+    def _record_error(self, error: Exception) -> str:
+        """Build a user-facing error message and record it in memory."""
+        error_str = str(error)
+        # Provide helpful error messages for common API key issues
+        if "API key expired" in error_str or "API_KEY_INVALID" in error_str:
+            error_msg = (
+                f"❌ API Key Error: {error_str}\n\n"
+                "This usually means:\n"
+                "1. Your API key has expired - get a new one from https://aistudio.google.com/apikey\n"
+                "2. Your API key is invalid - verify it's correct in your .env file\n"
+                "3. Your API key doesn't have the required permissions\n\n"
+                "To fix:\n"
+                "- Visit https://aistudio.google.com/apikey to create/renew your API key\n"
+                "- Update your .env file with: GEMINI_API_KEY=your_new_key_here\n"
+                "- Make sure the key starts with 'AIza'"
+            )
+        else:
+            error_msg = f"Error processing message: {error_str}"
+        
+        self.memory.add_short_term(error_msg, importance=1.0)
+        return error_msg
+    
+    def _generation_config(self, temperature: float) -> types.GenerateContentConfig:
+        """Get the generation config, reused until the instruction or tools change."""
+        signature = (self.model, self.system_instruction, self.tool_registry.version)
+        if signature != self._config_signature:
+            cached_content = self._create_context_cache() if CONTEXT_CACHE_TTL > 0 else None
+            if cached_content is not None:
+                # The instruction and tools live in the cache, not in each request
+                self._base_config = types.GenerateContentConfig(
+                    temperature=0.1,
+                    cached_content=cached_content
                 )
             else:
-                error_msg = f"Error processing message: {error_str}"
-            
-            self.memory.add_short_term(error_msg, importance=1.0)
-            return error_msg
+                # Validate the instruction and tool schemas once per change
+                self._base_config = types.GenerateContentConfig(
+                    temperature=0.1,
+                    system_instruction=self.system_instruction,
+                    tools=self.tool_registry.get_tools_config()
+                )
+            self._config_cache = {}
+            self._config_signature = signature
+        
+        config = self._config_cache.get(temperature)
+        if config is None:
+            # model_copy skips validation and shares the validated tool list
+            config = self._base_config.model_copy(update={"temperature": temperature})
+            self._config_cache[temperature] = config
+        return config
+    
+    def _create_context_cache(self) -> Optional[str]:
+        """Upload the instruction and tools to a Gemini context cache and return its name.
+        
+        Returns None when Gemini declines (for instance, content below the
+        model's minimum cache size), so requests carry them inline instead.
+        """
+        try:
+            cache = self.client.caches.create(
+                model=self.model,
+                config=types.CreateCachedContentConfig(
+                    system_instruction=self.system_instruction,
+                    tools=self.tool_registry.get_tools_config(),
+                    ttl=f"{CONTEXT_CACHE_TTL}s"
+                )
+            )
+            return cache.name
+        except Exception as e:
+            print(f"Context caching unavailable, sending the instruction inline: {e}")
+            return None
+    
+    async def _generate_content(self, **kwargs):
+        """Call Gemini off the event loop, bounded by the shared request limit."""
+        async with _request_semaphore:
+            return await asyncio.to_thread(self.client.models.generate_content, **kwargs)
+    
+    async def _stream_content(self, **kwargs) -> AsyncIterator[Any]:
+        """Stream Gemini chunks from a worker thread, bounded by the shared request limit."""
+        loop = asyncio.get_running_loop()
+        queue: asyncio.Queue = asyncio.Queue()
+        
+        def produce():
+            try:
+                for chunk in self.client.models.generate_content_stream(**kwargs):
+                    loop.call_soon_threadsafe(queue.put_nowait, chunk)
+            except Exception as e:
+                loop.call_soon_threadsafe(queue.put_nowait, e)
+            finally:
+                loop.call_soon_threadsafe(queue.put_nowait, _STREAM_END)
+        
+        async with _request_semaphore:
+            producer = loop.run_in_executor(None, produce)
+            while True:
+                item = await queue.get()
+                if item is _STREAM_END:
+                    break
+                if isinstance(item, Exception):
+                    raise item
+                yield item
+            await producer
+    
+    @staticmethod
+    def _chunk_parts(chunk) -> List[types.Part]:
+        """Return the content parts of a streamed chunk, if it has any."""
+        if not chunk.candidates or chunk.candidates[0].content is None:
+            return []
+        return chunk.candidates[0].content.parts or []
+    
+    def _cache_scope(self, temperature: float, stateless: bool = False) -> str:
+        """Hash everything other than the message that shapes a response."""
+        # get_context shows the previous four items alongside the new message;
+        # stateless messages are sent without it
+        history = [] if stateless else list(self.memory.short_term)[-4:]
+        return hash_key(
+            self.model,
+            self.system_instruction,
+            ",".join(sorted(self.tool_registry.tools)),
+            repr(temperature),
+            *(mem.content for mem in history)
+        )
     
     async def _handle_function_calls(self, response, contents) -> str:
         """Handle function calls from the model."""
@@ -350,47 +958,24 @@ class PyMOLAgent:
             if part.function_call:
                 function_calls.append(part.function_call)
         
-        # Execute function calls
-        results = []
+        # Execute function calls, concurrently where the tools allow it
+        tool_batch = self._tool_batch()
         for call in function_calls:
-            tool_name = call.name
-            args = call.args
-            
-            if tool_name in self.tool_registry.tools:
-                try:
-                    result = self.tool_registry.tools[tool_name](**args)
-                    results.append({
-                        "name": tool_name,
-                        "response": result
-                    })
-                except Exception as e:
-                    results.append({
-                        "name": tool_name,
-                        "response": {"error": str(e)}
-                    })
-        
-        # Send results back to model
-        function_response_parts = [
-            types.Part.from_function_response(
-                name=result["name"],
-                response=result["response"]
-            )
-            for result in results
-        ]
+            if call.name in self.tool_registry.tools:
+                tool_batch.submit(call)
+        calls = tool_batch.calls
+        outcomes = await tool_batch.results()
         
         # Add to conversation
         contents.append(response.candidates[0].content)
-        contents.append(types.Content(role="user", parts=function_response_parts))
+        contents.append(types.Content(role="user",
+                                      parts=self._function_response_parts(calls, outcomes)))
         
         # Get final response
-        final_response = self.client.models.generate_content(
+        final_response = await self._generate_content(
             model=self.model,
             contents=contents,
-            config=types.GenerateContentConfig(
-                temperature=0.1,
-                system_instruction=self.system_instruction,
-                tools=self.tool_registry.get_tools_config()
-            )
+            config=self._generation_config(0.1)
         )
         
         final_text = final_response.text
@@ -398,9 +983,31 @@ class PyMOLAgent:
         
         return final_text
     
-    def add_tool(self, name: str, func: Callable, description: str = None):
-        """Add a new tool to the agent."""
-        self.tool_registry.register_tool(name, func, description)
+    def _tool_batch(self) -> ToolCallBatch:
+        """Start a batch for one turn's tool calls."""
+        return ToolCallBatch(self._run_tool, self.tool_registry.ordered_tools)
+    
+    async def _run_tool(self, call, semaphore: asyncio.Semaphore) -> Any:
+        """Run one tool call in a worker thread, reporting failures as an error result."""
+        async with semaphore:
+            try:
+                return await asyncio.get_running_loop().run_in_executor(
+                    _tool_executor, self.tool_registry.dispatch, call.name, call.args)
+            except Exception as e:
+                return {"error": str(e)}
+    
+    @staticmethod
+    def _function_response_parts(calls, outcomes) -> List[types.Part]:
+        """Package tool results as function responses for the model."""
+        return [
+            types.Part.from_function_response(name=call.name, response=outcome)
+            for call, outcome in zip(calls, outcomes)
+        ]
+    
+    def add_tool(self, name: str, func: Callable, description: str = None,
+                 ordered: bool = False):
+        """Add a new tool to the agent; ordered tools run in call order, one at a time."""
+        self.tool_registry.register_tool(name, func, description, ordered)
     
     def get_memory_summary(self) -> str:
         """Get a summary of agent's memory state."""
@@ -0,0 +1,26 @@
+"""
+Phase 1: Foundation - Configuration
+This module loads the .env file and resolves settings shared across the agent.
+"""
+
+import functools
+import os
+import re
+
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv()
+
+# Google API keys: "AIza" followed by 35 URL-safe characters
+API_KEY_PATTERN = re.compile(r"AIza[A-Za-z0-9_-]{35}")
+
+
+@functools.lru_cache(maxsize=1)
+def get_api_key() -> str:
+    """Return the Gemini API key from GEMINI_API_KEY or GOOGLE_API_KEY, stripped.
+
+    Whitespace picked up from a .env file is removed here, once, so every
+    caller sees the same key. Returns an empty string when neither is set.
+    """
+    return (os.getenv("GEMINI_API_KEY") or os.getenv("GOOGLE_API_KEY") or "").strip()
@@ -3,21 +3,91 @@ Phase 2: Tool Development - Desktop Controller Tool
 This module provides desktop automation capabilities for GUI interaction.
 """
 
+import functools
+import os
 import subprocess
-import time
-import json
-from typing import Dict, Any, List, Optional, Tuple
+import sys
+from typing import Any, Callable, Dict, List, Optional, Tuple
 from pathlib import Path
 
+from native_input import NATIVE_INPUT_AVAILABLE, native_click
+from screen_capture import NUMPY_AVAILABLE, grab_frame, save_screenshot, screenshot_filename
+from window_cache import find_windows, wait_until_active
+
 try:
-    import pyautogui
-    import pygetwindow as gw
-    AUTOMATION_AVAILABLE = True
-    # Configure pyautogui to be safer
-    pyautogui.FAILSAFE = True
-    pyautogui.PAUSE = 0.5
+    import pyperclip
+    CLIPBOARD_AVAILABLE = True
 except ImportError:
-    AUTOMATION_AVAILABLE = False
+    CLIPBOARD_AVAILABLE = False
+
+# pyautogui and pygetwindow take hundreds of milliseconds to import (pyautogui
+# also connects to the display), so they are loaded on the first automation call
+pyautogui = None
+gw = None
+AUTOMATION_AVAILABLE: Optional[bool] = None
+
+# Click function per button name, filled in once pyautogui has loaded
+_CLICK_DISPATCH: Dict[str, Callable] = {}
+
+# Cleared if a native click raises (no X display, SendInput blocked), after
+# which clicks go through pyautogui for the rest of the process
+_native_input_usable = NATIVE_INPUT_AVAILABLE
+
+# Native (button, clicks) per button name
+_NATIVE_CLICKS = {
+    "left": ("left", 1),
+    "right": ("right", 1),
+    "middle": ("middle", 1),
+    "double": ("left", 2),
+}
+
+
+def _load_automation() -> bool:
+    """Import the automation libraries on first use and report whether they loaded."""
+    global pyautogui, gw, AUTOMATION_AVAILABLE
+    if AUTOMATION_AVAILABLE is None:
+        try:
+            import pyautogui as _pyautogui
+            import pygetwindow as _gw
+        except ImportError:
+            AUTOMATION_AVAILABLE = False
+        else:
+            # Configure pyautogui to be safer
+            _pyautogui.FAILSAFE = True
+            # Pause after every pyautogui call; agents don't need human pacing by default
+            _pyautogui.PAUSE = float(os.getenv("AGENT_PYAUTOGUI_PAUSE", "0"))
+            pyautogui, gw = _pyautogui, _gw
+            _CLICK_DISPATCH.update(
+                left=_pyautogui.click,
+                right=_pyautogui.rightClick,
+                double=_pyautogui.doubleClick,
+            )
+            AUTOMATION_AVAILABLE = True
+    return AUTOMATION_AVAILABLE
+
+
+# In "auto" mode, text longer than this is pasted rather than typed key by key
+PASTE_THRESHOLD = 64
+
+
+_NO_AUTOMATION = {
+    "success": False,
+    "error": "Desktop automation libraries not available. Install with: pip install pyautogui pygetwindow"
+}
+
+
+def _needs_automation(method):
+    """Return the unavailable error instead of running a method without the automation libraries.
+    
+    Once the libraries have loaded, the guard is a single flag check.
+    """
+    @functools.wraps(method)
+    def guarded(*args, **kwargs) -> Dict[str, Any]:
+        if AUTOMATION_AVAILABLE or _load_automation():
+            return method(*args, **kwargs)
+        return dict(_NO_AUTOMATION)
+    
+    return guarded
 
 
 class DesktopController:
@@ -25,39 +95,26 @@ class DesktopController:
     
     def __init__(self):
         self.screen_size = None
-        if AUTOMATION_AVAILABLE:
+        if _load_automation():
             self.screen_size = pyautogui.size()
     
+    @_needs_automation
     def get_screen_info(self) -> Dict[str, Any]:
-        """Get screen dimensions and display information."""
-        if not AUTOMATION_AVAILABLE:
-            return {
-                "success": False,
-                "error": "Desktop automation libraries not available. Install with: pip install pyautogui pygetwindow"
-            }
+        """Get screen dimensions from the size cached at construction.
         
+        The cursor isn't queried here; use get_mouse_position for that.
+        """
         return {
             "success": True,
             "screen_width": self.screen_size.width,
-            "screen_height": self.screen_size.height,
-            "current_position": pyautogui.position()
+            "screen_height": self.screen_size.height
         }
     
+    @_needs_automation
     def find_window(self, title_pattern: str) -> Dict[str, Any]:
         """Find windows matching a title pattern."""
-        if not AUTOMATION_AVAILABLE:
-            return {
-                "success": False,
-                "error": "Desktop automation libraries not available"
-            }
-        
         try:
-            windows = gw.getWindowsWithTitle(title_pattern)
-            
-            if not windows:
-                # Try partial match
-                    all_windows = gw.getAllWindows()
-                    windows = [w for w in all_windows if title_pattern.lower() in w.title.lower()]
+            windows = find_windows(title_pattern)
             
             if windows:
                 window_list = []
@@ -89,23 +146,16 @@ class DesktopController:
                 "error": f"Error finding windows: {str(e)}"
             }
     
+    @_needs_automation
     def activate_window(self, title: str) -> Dict[str, Any]:
         """Activate and bring a window to the foreground."""
-        if not AUTOMATION_AVAILABLE:
-            return {
-                "success": False,
-                "error": "Desktop automation libraries not available"
-            }
-        
         try:
-            windows = gw.getWindowsWithTitle(title)
-            if not windows:
-                windows = [w for w in gw.getAllWindows() if title.lower() in w.title.lower()]
+            windows = find_windows(title)
             
             if windows:
                 window = windows[0]
                 window.activate()
-                time.sleep(0.5)  # Wait for activation
+                wait_until_active(window)
                 
                 return {
                     "success": True,
@@ -127,23 +177,28 @@ class DesktopController:
                 "error": f"Error activating window: {str(e)}"
             }
     
+    @_needs_automation
     def click_at_position(self, x: int, y: int, button: str = "left") -> Dict[str, Any]:
         """Click at specified screen coordinates."""
-        if not AUTOMATION_AVAILABLE:
-            return {
-                "success": False,
-                "error": "Desktop automation libraries not available"
-            }
-        
+        global _native_input_usable
         try:
-            if button == "left":
-                pyautogui.click(x, y)
-            elif button == "right":
-                pyautogui.rightClick(x, y)
-            elif button == "double":
-                pyautogui.doubleClick(x, y)
-            else:
-                pyautogui.click(x, y, button=button)
+            clicked = False
+            native = _NATIVE_CLICKS.get(button) if _native_input_usable else None
+            if native:
+                # pyautogui's corner fail-safe still applies to the native path
+                pyautogui.failSafeCheck()
+                try:
+                    clicked = native_click(x, y, *native)
+                except Exception as e:
+                    print(f"Native input unavailable, clicking through pyautogui: {e}")
+                    _native_input_usable = False
+            
+            if not clicked:
+                click = _CLICK_DISPATCH.get(button)
+                if click:
+                    click(x, y)
+                else:
+                    pyautogui.click(x, y, button=button)
             
             return {
                 "success": True,
@@ -156,16 +211,35 @@ class DesktopController:
                 "error": f"Error clicking at position: {str(e)}"
             }
     
-    def type_text(self, text: str, interval: float = 0.1) -> Dict[str, Any]:
-        """Type text using keyboard."""
-        if not AUTOMATION_AVAILABLE:
+    @_needs_automation
+    def type_text(self, text: str, interval: float = 0.1, method: str = "auto") -> Dict[str, Any]:
+        """Type text using keyboard.
+        
+        method is "type" (one keystroke per character), "paste" (copy to the
+        clipboard and send the paste shortcut) or "auto", which pastes text
+        longer than PASTE_THRESHOLD when a clipboard is available. Pasting
+        replaces the clipboard contents.
+        """
+        if method not in ("auto", "type", "paste"):
+            return {
+                "success": False,
+                "error": f"Invalid method: {method}. Valid options: ['auto', 'type', 'paste']"
+            }
+        
+        if method == "paste" and not CLIPBOARD_AVAILABLE:
             return {
                 "success": False,
-                "error": "Desktop automation libraries not available"
+                "error": "Clipboard library not available. Install with: pip install pyperclip"
             }
         
         try:
-            pyautogui.typewrite(text, interval=interval)
+            paste = method == "paste" or (
+                method == "auto" and CLIPBOARD_AVAILABLE and len(text) > PASTE_THRESHOLD)
+            if paste:
+                pyperclip.copy(text)
+                pyautogui.hotkey("command" if sys.platform == "darwin" else "ctrl", "v")
+            else:
+                pyautogui.typewrite(text, interval=interval)
             return {
                 "success": True,
                 "action": f"Typed text: {text[:50]}{'...' if len(text) > 50 else ''}"
@@ -177,14 +251,9 @@ class DesktopController:
                 "error": f"Error typing text: {str(e)}"
             }
     
+    @_needs_automation
     def press_key(self, key: str) -> Dict[str, Any]:
         """Press a keyboard key."""
-        if not AUTOMATION_AVAILABLE:
-            return {
-                "success": False,
-                "error": "Desktop automation libraries not available"
-            }
-        
         try:
             pyautogui.press(key)
             return {
@@ -198,25 +267,38 @@ class DesktopController:
                 "error": f"Error pressing key: {str(e)}"
             }
     
-    def take_screenshot(self, filename: str = None) -> Dict[str, Any]:
-        """Take a screenshot of the entire screen."""
-        if not AUTOMATION_AVAILABLE:
-            return {
-                "success": False,
-                "error": "Desktop automation libraries not available"
-            }
+    @_needs_automation
+    def take_screenshot(self, filename: str = None, return_array: bool = False,
+                        max_dim: Optional[int] = None) -> Dict[str, Any]:
+        """Take a screenshot of the entire screen.
         
+        With return_array, the pixels come back as an (H, W, 3) RGB numpy
+        array under "frame" and no image file is written. With max_dim, the
+        capture is downscaled so its longer side is at most max_dim pixels.
+        """
         try:
+            if return_array:
+                if not NUMPY_AVAILABLE:
+                    return {
+                        "success": False,
+                        "error": "numpy is required for in-memory screenshots"
+                    }
+                frame = grab_frame(max_dim=max_dim)
+                return {
+                    "success": True,
+                    "frame": frame,
+                    "size": (frame.shape[1], frame.shape[0])
+                }
+            
             if not filename:
-                timestamp = int(time.time())
-                filename = f"screenshot_{timestamp}.png"
+                filename = screenshot_filename()
             
-            screenshot = pyautogui.screenshot(filename)
+            size = save_screenshot(filename, max_dim=max_dim)
             
             return {
                 "success": True,
                 "filename": filename,
-                "size": screenshot.size
+                "size": size
             }
             
         except Exception as e:
@@ -225,14 +307,9 @@ class DesktopController:
                 "error": f"Error taking screenshot: {str(e)}"
             }
     
+    @_needs_automation
     def get_mouse_position(self) -> Dict[str, Any]:
         """Get current mouse position."""
-        if not AUTOMATION_AVAILABLE:
-            return {
-                "success": False,
-                "error": "Desktop automation libraries not available"
-            }
-        
         pos = pyautogui.position()
         return {
             "success": True,
@@ -240,15 +317,10 @@ class DesktopController:
             "y": pos.y
         }
     
+    @_needs_automation
     def drag_mouse(self, start_x: int, start_y: int, end_x: int, end_y: int, 
                    duration: float = 1.0) -> Dict[str, Any]:
         """Drag mouse from start position to end position."""
-        if not AUTOMATION_AVAILABLE:
-            return {
-                "success": False,
-                "error": "Desktop automation libraries not available"
-            }
-        
         try:
             pyautogui.drag(end_x - start_x, end_y - start_y, duration=duration, 
                           button='left', start=(start_x, start_y))
@@ -264,15 +336,26 @@ class DesktopController:
             }
 
 
+# Shared controller so the screen size is queried once, not on every tool call
+_controller: Optional[DesktopController] = None
+
+
+def _get_controller() -> DesktopController:
+    """Return the module-wide DesktopController, creating it on first use."""
+    global _controller
+    if _controller is None:
+        _controller = DesktopController()
+    return _controller
+
+
 # Desktop control tool functions for the agent
 def get_desktop_info() -> dict:
     """Get desktop screen information.
     
     Returns:
-        Dictionary containing screen dimensions and current mouse position
+        Dictionary containing screen dimensions
     """
-    controller = DesktopController()
-    return controller.get_screen_info()
+    return _get_controller().get_screen_info()
 
 
 def find_application_window(title_pattern: str) -> dict:
@@ -284,8 +367,7 @@ def find_application_window(title_pattern: str) -> dict:
     Returns:
         Dictionary containing information about found windows
     """
-    controller = DesktopController()
-    return controller.find_window(title_pattern)
+    return _get_controller().find_window(title_pattern)
 
 
 def activate_application_window(title: str) -> dict:
@@ -297,8 +379,7 @@ def activate_application_window(title: str) -> dict:
     Returns:
         Dictionary containing activation result
     """
-    controller = DesktopController()
-    return controller.activate_window(title)
+    return _get_controller().activate_window(title)
 
 
 def click_at_coordinates(x: int, y: int, button: str = "left") -> dict:
@@ -307,27 +388,27 @@ def click_at_coordinates(x: int, y: int, button: str = "left") -> dict:
     Args:
         x: X coordinate
         y: Y coordinate
-        button: Mouse button ("left", "right", "double")
+        button: Mouse button ("left", "right", "middle", "double")
         
     Returns:
         Dictionary containing click result
     """
-    controller = DesktopController()
-    return controller.click_at_position(x, y, button)
+    return _get_controller().click_at_position(x, y, button)
 
 
-def type_keyboard_text(text: str, interval: float = 0.1) -> dict:
+def type_keyboard_text(text: str, interval: float = 0.1, method: str = "auto") -> dict:
     """Type text using the keyboard.
     
     Args:
         text: Text to type
         interval: Interval between keystrokes in seconds
+        method: "type" for keystrokes, "paste" to paste via the clipboard, or "auto"
+            to paste long text when a clipboard is available
         
     Returns:
         Dictionary containing typing result
     """
-    controller = DesktopController()
-    return controller.type_text(text, interval)
+    return _get_controller().type_text(text, interval, method)
 
 
 def press_keyboard_key(key: str) -> dict:
@@ -339,21 +420,20 @@ def press_keyboard_key(key: str) -> dict:
     Returns:
         Dictionary containing key press result
     """
-    controller = DesktopController()
-    return controller.press_key(key)
+    return _get_controller().press_key(key)
 
 
-def capture_screenshot(filename: str = None) -> dict:
+def capture_screenshot(filename: str = None, max_dim: int = None) -> dict:
     """Take a screenshot of the entire screen.
     
     Args:
         filename: Optional filename for the screenshot
+        max_dim: Optional limit on the longer side in pixels; larger captures are downscaled
         
     Returns:
         Dictionary containing screenshot result
     """
-    controller = DesktopController()
-    return controller.take_screenshot(filename)
+    return _get_controller().take_screenshot(filename, max_dim=max_dim)
 
 
 def get_current_mouse_position() -> dict:
@@ -362,8 +442,7 @@ def get_current_mouse_position() -> dict:
     Returns:
         Dictionary containing mouse coordinates
     """
-    controller = DesktopController()
-    return controller.get_mouse_position()
+    return _get_controller().get_mouse_position()
 
 
 def drag_mouse_coordinates(start_x: int, start_y: int, end_x: int, end_y: int, 
@@ -380,33 +459,42 @@ def drag_mouse_coordinates(start_x: int, start_y: int, end_x: int, end_y: int,
     Returns:
         Dictionary containing drag result
     """
-    controller = DesktopController()
-    return controller.drag_mouse(start_x, start_y, end_x, end_y, duration)
+    return _get_controller().drag_mouse(start_x, start_y, end_x, end_y, duration)
+
+
+# Desktop control tools as (name, function, description); the single list
+# used for registration
+_DESKTOP_TOOLS = [
+    ("get_desktop_info", get_desktop_info,
+     "Get desktop screen dimensions"),
+    ("find_application_window", find_application_window,
+     "Find application windows matching a title pattern"),
+    ("activate_application_window", activate_application_window,
+     "Activate and bring an application window to the foreground"),
+    ("click_at_coordinates", click_at_coordinates,
+     "Click at specified screen coordinates"),
+    ("type_keyboard_text", type_keyboard_text,
+     "Type text using the keyboard"),
+    ("press_keyboard_key", press_keyboard_key,
+     "Press a keyboard key"),
+    ("capture_screenshot", capture_screenshot,
+     "Take a screenshot of the entire screen"),
+    ("get_current_mouse_position", get_current_mouse_position,
+     "Get the current mouse cursor position"),
+    ("drag_mouse_coordinates", drag_mouse_coordinates,
+     "Drag mouse from start position to end position")
+]
+
+
+# Tools that send input or change focus; the agent runs their calls in order
+_ORDERED_TOOLS = frozenset({
+    "activate_application_window", "click_at_coordinates", "type_keyboard_text",
+    "press_keyboard_key", "drag_mouse_coordinates"
+})
 
 
 # Utility function to register all desktop control tools with the agent
 def register_desktop_tools(agent):
     """Register all desktop control tools with the agent."""
-    desktop_tools = [
-        ("get_desktop_info", get_desktop_info, 
-         "Get desktop screen information and mouse position"),
-        ("find_application_window", find_application_window, 
-         "Find application windows matching a title pattern"),
-        ("activate_application_window", activate_application_window, 
-         "Activate and bring an application window to the foreground"),
-        ("click_at_coordinates", click_at_coordinates, 
-         "Click at specified screen coordinates"),
-        ("type_keyboard_text", type_keyboard_text, 
-         "Type text using the keyboard"),
-        ("press_keyboard_key", press_keyboard_key, 
-         "Press a keyboard key"),
-        ("capture_screenshot", capture_screenshot, 
-         "Take a screenshot of the entire screen"),
-        ("get_current_mouse_position", get_current_mouse_position, 
-         "Get the current mouse cursor position"),
-        ("drag_mouse_coordinates", drag_mouse_coordinates, 
-         "Drag mouse from start position to end position")
-    ]
-    
-    for name, func, desc in desktop_tools:
-        agent.add_tool(name, func, desc)
\ No newline at end of file
+    for name, func, desc in _DESKTOP_TOOLS:
+        agent.add_tool(name, func, desc, ordered=name in _ORDERED_TOOLS)
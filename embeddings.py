@@ -0,0 +1,296 @@
+"""
+Phase 1: Foundation - Memory Embeddings
+This module provides semantic embeddings and vector search for the agent's memory.
+"""
+
+import base64
+import os
+from functools import lru_cache
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+try:
+    import numpy as np
+    NUMPY_AVAILABLE = True
+except ImportError:
+    NUMPY_AVAILABLE = False
+
+try:
+    from sentence_transformers import SentenceTransformer
+    SENTENCE_TRANSFORMERS_AVAILABLE = True
+except ImportError:
+    SENTENCE_TRANSFORMERS_AVAILABLE = False
+
+try:
+    import onnxruntime as ort
+    from tokenizers import Tokenizer
+    ONNX_AVAILABLE = True
+except ImportError:
+    ONNX_AVAILABLE = False
+
+
+EMBEDDING_MODEL_NAME = os.getenv("AGENT_EMBEDDING_MODEL", "all-MiniLM-L6-v2")
+
+# Directory holding an ONNX export of the model (model.onnx or model_int8.onnx
+# plus tokenizer.json); when set, embeddings run on ONNX Runtime instead of PyTorch
+EMBEDDING_ONNX_DIR = os.getenv("AGENT_EMBEDDING_ONNX_DIR")
+USE_ONNX = bool(EMBEDDING_ONNX_DIR) and ONNX_AVAILABLE
+
+EMBEDDINGS_AVAILABLE = NUMPY_AVAILABLE and (USE_ONNX or SENTENCE_TRANSFORMERS_AVAILABLE)
+
+# Stored vectors are int8-quantized; records from other models/formats get re-embedded
+EMBEDDING_FORMAT = f"{EMBEDDING_MODEL_NAME}{'/onnx' if USE_ONNX else ''}/int8"
+
+# Normalized components lie in [-1, 1], so one fixed scale maps them onto int8
+QUANTIZATION_SCALE = 127.0
+
+# Texts per model forward pass; memories are queued and embedded this many at a time
+EMBED_BATCH_SIZE = 64
+
+# Minimum cosine similarity for a memory to count as relevant
+SIMILARITY_THRESHOLD = 0.4
+
+_model = None
+
+
+class OnnxEmbedder:
+    """Mean-pooled sentence embeddings from an ONNX export, without PyTorch.
+    
+    Exposes the subset of SentenceTransformer.encode that this module uses.
+    """
+    
+    def __init__(self, model_dir: str, max_length: int = 256):
+        model_dir = Path(model_dir)
+        model_path = model_dir / "model_int8.onnx"
+        if not model_path.exists():
+            model_path = model_dir / "model.onnx"
+        
+        self.session = ort.InferenceSession(str(model_path), providers=["CPUExecutionProvider"])
+        self.input_names = {model_input.name for model_input in self.session.get_inputs()}
+        self.tokenizer = Tokenizer.from_file(str(model_dir / "tokenizer.json"))
+        self.tokenizer.enable_truncation(max_length)
+        self.tokenizer.enable_padding()
+    
+    def encode(self, texts: List[str], batch_size: int = 32,
+               normalize_embeddings: bool = True, convert_to_numpy: bool = True) -> "np.ndarray":
+        batches = []
+        for start in range(0, len(texts), batch_size):
+            encodings = self.tokenizer.encode_batch(texts[start:start + batch_size])
+            attention_mask = np.array([e.attention_mask for e in encodings], dtype=np.int64)
+            feeds = {
+                "input_ids": np.array([e.ids for e in encodings], dtype=np.int64),
+                "attention_mask": attention_mask
+            }
+            if "token_type_ids" in self.input_names:
+                feeds["token_type_ids"] = np.array([e.type_ids for e in encodings], dtype=np.int64)
+            
+            hidden = self.session.run(None, feeds)[0]
+            mask = attention_mask[..., None].astype(np.float32)
+            batches.append((hidden * mask).sum(axis=1) / np.maximum(mask.sum(axis=1), 1e-9))
+        
+        vectors = np.concatenate(batches).astype(np.float32)
+        if normalize_embeddings:
+            vectors /= np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+        return vectors
+
+
+def get_embedding_model():
+    """Load the sentence embedding model once and reuse it."""
+    global _model
+    if _model is None:
+        if USE_ONNX:
+            _model = OnnxEmbedder(EMBEDDING_ONNX_DIR)
+        else:
+            _model = SentenceTransformer(EMBEDDING_MODEL_NAME)
+    return _model
+
+
+def embed_texts(texts: List[str]) -> "np.ndarray":
+    """Embed texts as L2-normalized float32 vectors of shape (N, D)."""
+    vectors = get_embedding_model().encode(
+        texts,
+        batch_size=EMBED_BATCH_SIZE,
+        normalize_embeddings=True,
+        convert_to_numpy=True
+    )
+    return np.ascontiguousarray(vectors, dtype=np.float32)
+
+
+@lru_cache(maxsize=256)
+def embed_query(text: str) -> "np.ndarray":
+    """Embed a single query string, reusing the vector for repeated text."""
+    vector = embed_texts([text])[0]
+    vector.setflags(write=False)
+    return vector
+
+
+def quantize_vectors(vectors: "np.ndarray") -> "np.ndarray":
+    """Scalar-quantize normalized float vectors to int8."""
+    return np.clip(np.rint(vectors * QUANTIZATION_SCALE), -127, 127).astype(np.int8)
+
+
+def encode_vector(vector: "np.ndarray") -> str:
+    """Serialize an int8 vector as base64 text for JSON records."""
+    return base64.b64encode(np.asarray(vector, dtype=np.int8).tobytes()).decode('ascii')
+
+
+def decode_vectors(encoded: List[str]) -> "np.ndarray":
+    """Decode base64 int8 vectors into one contiguous (N, D) array."""
+    first = np.frombuffer(base64.b64decode(encoded[0]), dtype=np.int8)
+    vectors = np.empty((len(encoded), first.size), dtype=np.int8)
+    vectors[0] = first
+    for i, text in enumerate(encoded[1:], 1):
+        vectors[i] = np.frombuffer(base64.b64decode(text), dtype=np.int8)
+    return vectors
+
+
+class VectorIndex:
+    """Exact cosine-similarity search over one contiguous embedding matrix.
+
+    Embeddings live in a single (N, D) array rather than on the items,
+    and each item only records its `row`. Rows are L2-normalized and
+    stored as int8, a quarter of the float32 footprint, so scoring the
+    whole corpus is one matrix-vector product.
+    """
+
+    def __init__(self, initial_capacity: int = 64):
+        self.vectors = None
+        self.items: List[Any] = []
+        self._initial_capacity = initial_capacity
+        self._discarded = 0
+
+    def __len__(self) -> int:
+        return len(self.items) - self._discarded
+
+    def add(self, vectors: "np.ndarray", items: List[Any]):
+        """Add one embedding row per item and record each item's row."""
+        if vectors.dtype != np.int8:
+            vectors = quantize_vectors(vectors)
+
+        start = len(self.items)
+        end = start + len(items)
+
+        if self.vectors is None:
+            capacity = max(end, self._initial_capacity)
+            self.vectors = np.empty((capacity, vectors.shape[1]), dtype=np.int8)
+        elif end > len(self.vectors):
+            # Double the capacity so appends stay amortized O(1)
+            grown = np.empty((max(end, 2 * len(self.vectors)), self.vectors.shape[1]),
+                             dtype=np.int8)
+            grown[:start] = self.vectors[:start]
+            self.vectors = grown
+
+        self.vectors[start:end] = vectors
+        for row, item in enumerate(items, start):
+            item.row = row
+            self.items.append(item)
+
+    def get_vector(self, item: Any) -> Optional["np.ndarray"]:
+        """Return the stored (quantized) embedding for an item, if it has one."""
+        row = self._row_of(item)
+        return None if row is None else self.vectors[row]
+
+    def discard(self, item: Any):
+        """Stop returning an item from searches (its row stays allocated)."""
+        row = self._row_of(item)
+        if row is not None:
+            self.items[row] = None
+            item.row = None
+            self._discarded += 1
+
+    def search(self, query: "np.ndarray", limit: int,
+               threshold: float = SIMILARITY_THRESHOLD,
+               rows: Optional["np.ndarray"] = None) -> List[Tuple[Any, float]]:
+        """Return up to `limit` (item, score) pairs scoring at least `threshold`.
+
+        If `rows` is given, only those rows are scored.
+        """
+        count = len(self.items)
+        if self.vectors is None or len(self) == 0:
+            return []
+
+        # Only the corpus is quantized; the float query keeps scores accurate
+        candidates = self.vectors[:count] if rows is None else self.vectors[rows]
+        scores = (candidates @ (query / QUANTIZATION_SCALE)).astype(np.float32)
+        if not len(scores):
+            return []
+
+        # Over-fetch by the number of discarded rows so they can't crowd out live hits
+        k = min(limit + self._discarded, len(scores))
+        top = np.argpartition(-scores, k - 1)[:k] if k < len(scores) else np.arange(len(scores))
+        top = top[np.argsort(-scores[top])]
+
+        results = []
+        for position in top:
+            score = float(scores[position])
+            if score < threshold:
+                break
+            item = self.items[position if rows is None else rows[position]]
+            if item is not None:
+                results.append((item, score))
+                if len(results) == limit:
+                    break
+
+        return results
+
+    def _row_of(self, item: Any) -> Optional[int]:
+        row = getattr(item, 'row', None)
+        if row is not None and row < len(self.items) and self.items[row] is item:
+            return row
+        return None
+
+
+class SessionIndex:
+    """Groups index rows by session and ranks sessions by their mean embedding.
+
+    Searching only the rows of the best-matching sessions keeps query cost
+    proportional to a few sessions rather than the whole memory.
+    """
+
+    def __init__(self):
+        self.rows: Dict[str, List[int]] = {}
+        self._sums: Dict[str, "np.ndarray"] = {}
+
+    def __len__(self) -> int:
+        return len(self.rows)
+
+    def add(self, session_id: str, row: int, vector: "np.ndarray"):
+        """Record that an index row belongs to a session."""
+        self.rows.setdefault(session_id, []).append(row)
+        vector = vector.astype(np.float32)
+        if session_id in self._sums:
+            self._sums[session_id] += vector
+        else:
+            self._sums[session_id] = vector
+
+    def discard(self, session_id: str, row: int, vector: "np.ndarray"):
+        """Remove a row from its session, taking its vector out of the centroid.
+
+        A session left with no rows is dropped, so it can't be routed to.
+        """
+        rows = self.rows.get(session_id)
+        if rows is None or row not in rows:
+            return
+        rows.remove(row)
+        if rows:
+            self._sums[session_id] -= vector.astype(np.float32)
+        else:
+            del self.rows[session_id]
+            del self._sums[session_id]
+
+    def candidate_rows(self, query: "np.ndarray", limit: int,
+                       include: Optional[str] = None) -> "np.ndarray":
+        """Return the rows of the `limit` sessions closest to the query.
+
+        The `include` session, if any, is always searched as well.
+        """
+        session_ids = list(self._sums)
+        centroids = np.stack([self._sums[session_id] for session_id in session_ids])
+        centroids /= np.maximum(np.linalg.norm(centroids, axis=1, keepdims=True), 1e-12)
+
+        best = [session_ids[i] for i in np.argsort(-(centroids @ query))[:limit]]
+        if include in self.rows and include not in best:
+            best.append(include)
+
+        return np.array([row for session_id in best for row in self.rows[session_id]],
+                        dtype=np.intp)
@@ -3,18 +3,36 @@ Phase 2: Tool Development - GUI Inspector Tool
 This module provides GUI inspection and accessibility capabilities.
 """
 
-import json
+import functools
 import subprocess
 import time
 from typing import Dict, Any, List, Optional
 from pathlib import Path
 
-try:
-    import pygetwindow as gw
-    import pyautogui
-    AUTOMATION_AVAILABLE = True
-except ImportError:
-    AUTOMATION_AVAILABLE = False
+from screen_capture import NUMPY_AVAILABLE, grab_frame, save_screenshot, screenshot_filename
+from window_cache import describe_windows, find_windows, wait_until_active
+
+# pygetwindow and pyautogui are slow to import, so they are loaded on the first
+# automation call
+gw = None
+pyautogui = None
+AUTOMATION_AVAILABLE: Optional[bool] = None
+
+
+def _load_automation() -> bool:
+    """Import the automation libraries on first use and report whether they loaded."""
+    global gw, pyautogui, AUTOMATION_AVAILABLE
+    if AUTOMATION_AVAILABLE is None:
+        try:
+            import pygetwindow as _gw
+            import pyautogui as _pyautogui
+        except ImportError:
+            AUTOMATION_AVAILABLE = False
+        else:
+            gw, pyautogui = _gw, _pyautogui
+            AUTOMATION_AVAILABLE = True
+    return AUTOMATION_AVAILABLE
+
 
 try:
     # Try to import accessibility libraries (platform-specific)
@@ -31,6 +49,29 @@ try:
 except:
     ACCESSIBILITY_AVAILABLE = False
 
+# Accessibility element types that respond to a click
+_CLICKABLE_TYPES = frozenset({"button", "menu", "link", "checkbox", "radio"})
+
+
+_NO_AUTOMATION = {
+    "success": False,
+    "error": "GUI automation libraries not available. Install with: pip install pygetwindow pyautogui"
+}
+
+
+def _needs_automation(method):
+    """Return the unavailable error instead of running a method without the automation libraries.
+    
+    Once the libraries have loaded, the guard is a single flag check.
+    """
+    @functools.wraps(method)
+    def guarded(*args, **kwargs) -> Dict[str, Any]:
+        if AUTOMATION_AVAILABLE or _load_automation():
+            return method(*args, **kwargs)
+        return dict(_NO_AUTOMATION)
+    
+    return guarded
+
 
 class GUIInspector:
     """Inspects GUI elements and provides accessibility information."""
@@ -39,55 +80,17 @@ class GUIInspector:
         self.current_window = None
         self.accessibility_enabled = ACCESSIBILITY_AVAILABLE
     
-    def get_window_hierarchy(self, window_title: str = None) -> Dict[str, Any]:
+    @_needs_automation
+    def get_window_hierarchy(self, window_title: str = None, reuse: bool = False) -> Dict[str, Any]:
         """Get the hierarchy of GUI elements in a window."""
-        if not AUTOMATION_AVAILABLE:
-            return {
-                "success": False,
-                "error": "GUI automation libraries not available. Install with: pip install pygetwindow pyautogui"
-            }
-        
         try:
-            if window_title:
-                windows = gw.getWindowsWithTitle(window_title)
-                if not windows:
-                    windows = [w for w in gw.getAllWindows() if window_title.lower() in w.title.lower()]
-                
-                if windows:
-                    target_window = windows[0]
-                else:
-                    return {
-                        "success": False,
-                        "error": f"Window not found: {window_title}"
-                    }
-            else:
-                target_window = gw.getActiveWindow()
-            
-            if not target_window:
-                return {
-                    "success": False,
-                    "error": "No active window found"
-                }
-            
-            # Basic window information
-            window_info = {
-                "title": target_window.title,
-                "size": (target_window.width, target_window.height),
-                "position": (target_window.left, target_window.top),
-                "is_active": target_window.isActive,
-                "is_visible": target_window.visible
-            }
-            
-            # Try to get more detailed GUI information
-            if self.accessibility_enabled:
-                detailed_info = self._get_accessibility_info(target_window)
-                window_info["accessibility_elements"] = detailed_info
-            else:
-                window_info["note"] = "Detailed accessibility information not available"
+            target_window, error = self._resolve_window(window_title, reuse)
+            if error:
+                return error
             
             return {
                 "success": True,
-                "window": window_info
+                "window": self._describe_window(target_window)
             }
             
         except Exception as e:
@@ -96,6 +99,67 @@ class GUIInspector:
                 "error": f"Error inspecting window: {str(e)}"
             }
     
+    def _resolve_window(self, window_title: str = None, reuse: bool = False):
+        """Find the window to inspect and remember it as the current window.
+        
+        Without a title, the active window is used. If `reuse` is set and the
+        previously resolved window is still open and active, it is used
+        without looking the active window up again.
+        
+        Returns (window, None), or (None, error_dict) if no window was found.
+        """
+        if window_title:
+            windows = find_windows(window_title)
+            if not windows:
+                return None, {
+                    "success": False,
+                    "error": f"Window not found: {window_title}"
+                }
+            target_window = windows[0]
+        elif reuse and self._current_window_active():
+            target_window = self.current_window
+        else:
+            target_window = gw.getActiveWindow()
+        
+        if not target_window:
+            return None, {
+                "success": False,
+                "error": "No active window found"
+            }
+        
+        self.current_window = target_window
+        return target_window, None
+    
+    def _current_window_active(self) -> bool:
+        """Whether the remembered window still exists and is in the foreground."""
+        if self.current_window is None:
+            return False
+        try:
+            return bool(self.current_window.isActive)
+        except Exception:
+            # The window has been closed since it was resolved
+            return False
+    
+    def _describe_window(self, target_window) -> Dict[str, Any]:
+        """Collect basic and accessibility information about a window."""
+        # Basic window information
+        window_info = {
+            "title": target_window.title,
+            "size": (target_window.width, target_window.height),
+            "position": (target_window.left, target_window.top),
+            "is_active": target_window.isActive,
+            "is_visible": target_window.visible
+        }
+        
+        # Try to get more detailed GUI information
+        if self.accessibility_enabled:
+            detailed_info = self._get_accessibility_info(target_window)
+            window_info["accessibility_elements"] = detailed_info
+        else:
+            window_info["note"] = "Detailed accessibility information not available"
+        
+        return window_info
+    
     def _get_accessibility_info(self, window) -> List[Dict[str, Any]]:
         """Get detailed accessibility information from window."""
         # This is a placeholder implementation
@@ -125,25 +189,33 @@ class GUIInspector:
         
         return elements
     
-    def find_clickable_elements(self, window_title: str = None) -> Dict[str, Any]:
+    @_needs_automation
+    def find_clickable_elements(self, window_title: str = None, reuse: bool = False) -> Dict[str, Any]:
         """Find clickable elements in a window."""
-        window_info = self.get_window_hierarchy(window_title)
-        
-        if not window_info["success"]:
-            return window_info
-        
-        elements = []
-        accessibility_elements = window_info["window"].get("accessibility_elements", [])
+        try:
+            target_window, error = self._resolve_window(window_title, reuse)
+            if error:
+                return error
+            
+            accessibility_elements = (self._get_accessibility_info(target_window)
+                                      if self.accessibility_enabled else [])
+        except Exception as e:
+            return {
+                "success": False,
+                "error": f"Error inspecting window: {str(e)}"
+            }
         
-        for elem in accessibility_elements:
-            if elem.get("type") in ["button", "menu", "link", "checkbox", "radio"]:
-                elements.append({
-                    "type": elem["type"],
-                    "label": elem.get("label", ""),
-                    "position": elem.get("position"),
-                    "size": elem.get("size"),
-                    "action": "click"
-                })
+        elements = [
+            {
+                "type": elem["type"],
+                "label": elem.get("label", ""),
+                "position": elem.get("position"),
+                "size": elem.get("size"),
+                "action": "click"
+            }
+            for elem in accessibility_elements
+            if elem.get("type") in _CLICKABLE_TYPES
+        ]
         
         return {
             "success": True,
@@ -151,14 +223,9 @@ class GUIInspector:
             "total_found": len(elements)
         }
     
+    @_needs_automation
     def get_element_at_position(self, x: int, y: int) -> Dict[str, Any]:
         """Get GUI element at specific screen coordinates."""
-        if not AUTOMATION_AVAILABLE:
-            return {
-                "success": False,
-                "error": "GUI automation libraries not available"
-            }
-        
         try:
             # Get active window
             active_window = gw.getActiveWindow()
@@ -198,42 +265,35 @@ class GUIInspector:
                 "error": f"Error identifying element: {str(e)}"
             }
     
-    def capture_window_state(self, window_title: str = None) -> Dict[str, Any]:
+    @_needs_automation
+    def capture_window_state(self, window_title: str = None, reuse: bool = False) -> Dict[str, Any]:
         """Capture the current state of a window."""
-        window_info = self.get_window_hierarchy(window_title)
-        
-        if not window_info["success"]:
-            return window_info
+        try:
+            target_window, error = self._resolve_window(window_title, reuse)
+            if error:
+                return error
+            
+            window_state = self._describe_window(target_window)
+        except Exception as e:
+            return {
+                "success": False,
+                "error": f"Error inspecting window: {str(e)}"
+            }
         
         # Add timestamp and state information
-        window_info["window"]["capture_timestamp"] = time.time()
-        window_info["window"]["screen_resolution"] = pyautogui.size() if AUTOMATION_AVAILABLE else "Unknown"
+        window_state["capture_timestamp"] = time.time()
+        window_state["screen_resolution"] = pyautogui.size()
         
         return {
             "success": True,
-            "window_state": window_info["window"]
+            "window_state": window_state
         }
     
+    @_needs_automation
     def list_all_windows(self) -> Dict[str, Any]:
         """List all visible windows."""
-        if not AUTOMATION_AVAILABLE:
-            return {
-                "success": False,
-                "error": "GUI automation libraries not available"
-            }
-        
         try:
-            all_windows = gw.getAllWindows()
-            window_list = []
-            
-            for window in all_windows:
-                if window.visible and window.title.strip():
-                    window_list.append({
-                        "title": window.title,
-                        "position": (window.left, window.top),
-                        "size": (window.width, window.height),
-                        "is_active": window.isActive
-                    })
+            window_list = describe_windows()
             
             return {
                 "success": True,
@@ -247,54 +307,49 @@ class GUIInspector:
                 "error": f"Error listing windows: {str(e)}"
             }
     
-    def get_window_screenshot(self, window_title: str = None) -> Dict[str, Any]:
-        """Take a screenshot of a specific window."""
-        if not AUTOMATION_AVAILABLE:
-            return {
-                "success": False,
-                "error": "GUI automation libraries not available"
-            }
+    @_needs_automation
+    def get_window_screenshot(self, window_title: str = None, return_array: bool = False,
+                              reuse: bool = False, max_dim: Optional[int] = None) -> Dict[str, Any]:
+        """Take a screenshot of a specific window.
         
+        With return_array, the pixels come back as an (H, W, 3) RGB numpy
+        array under "frame" and no image file is written. With max_dim, the
+        capture is downscaled so its longer side is at most max_dim pixels.
+        """
         try:
-            if window_title:
-                windows = gw.getWindowsWithTitle(window_title)
-                if not windows:
-                    windows = [w for w in gw.getAllWindows() if window_title.lower() in w.title.lower()]
-                
-                if windows:
-                    target_window = windows[0]
-                else:
-                    return {
-                        "success": False,
-                        "error": f"Window not found: {window_title}"
-                    }
-            else:
-                target_window = gw.getActiveWindow()
-            
-            if not target_window:
-                return {
-                    "success": False,
-                    "error": "No active window found"
-                }
+            target_window, error = self._resolve_window(window_title, reuse)
+            if error:
+                return error
             
             # Activate window and take screenshot
             target_window.activate()
-            time.sleep(0.5)
+            wait_until_active(target_window)
             
             # Screenshot the window area
-            screenshot = pyautogui.screenshot(
-                region=(target_window.left, target_window.top, 
-                       target_window.width, target_window.height)
-            )
+            region = (target_window.left, target_window.top,
+                      target_window.width, target_window.height)
+            if return_array:
+                if not NUMPY_AVAILABLE:
+                    return {
+                        "success": False,
+                        "error": "numpy is required for in-memory screenshots"
+                    }
+                frame = grab_frame(region, max_dim)
+                return {
+                    "success": True,
+                    "frame": frame,
+                    "window_title": target_window.title,
+                    "size": (frame.shape[1], frame.shape[0])
+                }
             
-            filename = f"window_screenshot_{int(time.time())}.png"
-            screenshot.save(filename)
+            filename = screenshot_filename("window_screenshot")
+            size = save_screenshot(filename, region, max_dim)
             
             return {
                 "success": True,
                 "filename": filename,
                 "window_title": target_window.title,
-                "size": (target_window.width, target_window.height)
+                "size": size
             }
             
         except Exception as e:
@@ -304,31 +359,45 @@ class GUIInspector:
             }
 
 
+# Shared inspector so the window resolved by one tool call can be reused by the next
+_inspector: Optional[GUIInspector] = None
+
+
+def _get_inspector() -> GUIInspector:
+    """Return the module-wide GUIInspector, creating it on first use."""
+    global _inspector
+    if _inspector is None:
+        _inspector = GUIInspector()
+    return _inspector
+
+
 # GUI inspector tool functions for the agent
-def inspect_window_hierarchy(window_title: str = None) -> dict:
+def inspect_window_hierarchy(window_title: str = None, reuse: bool = False) -> dict:
     """Get the hierarchy of GUI elements in a window.
     
     Args:
         window_title: Optional title of the window to inspect
+        reuse: Without a title, reuse the last inspected window if it is still open and
+            active, skipping the lookup; by default the active window is looked up
         
     Returns:
         Dictionary containing window hierarchy information
     """
-    inspector = GUIInspector()
-    return inspector.get_window_hierarchy(window_title)
+    return _get_inspector().get_window_hierarchy(window_title, reuse)
 
 
-def find_clickable_elements(window_title: str = None) -> dict:
+def find_clickable_elements(window_title: str = None, reuse: bool = False) -> dict:
     """Find clickable elements in a window.
     
     Args:
         window_title: Optional title of the window to inspect
+        reuse: Without a title, reuse the last inspected window if it is still open and
+            active, skipping the lookup; by default the active window is looked up
         
     Returns:
         Dictionary containing clickable elements information
     """
-    inspector = GUIInspector()
-    return inspector.find_clickable_elements(window_title)
+    return _get_inspector().find_clickable_elements(window_title, reuse)
 
 
 def get_element_at_coordinates(x: int, y: int) -> dict:
@@ -341,21 +410,21 @@ def get_element_at_coordinates(x: int, y: int) -> dict:
     Returns:
         Dictionary containing element information at the position
     """
-    inspector = GUIInspector()
-    return inspector.get_element_at_position(x, y)
+    return _get_inspector().get_element_at_position(x, y)
 
 
-def capture_window_state(window_title: str = None) -> dict:
+def capture_window_state(window_title: str = None, reuse: bool = False) -> dict:
     """Capture the current state of a window.
     
     Args:
         window_title: Optional title of the window to capture
+        reuse: Without a title, reuse the last inspected window if it is still open and
+            active, skipping the lookup; by default the active window is looked up
         
     Returns:
         Dictionary containing window state information
     """
-    inspector = GUIInspector()
-    return inspector.capture_window_state(window_title)
+    return _get_inspector().capture_window_state(window_title, reuse)
 
 
 def list_visible_windows() -> dict:
@@ -364,21 +433,22 @@ def list_visible_windows() -> dict:
     Returns:
         Dictionary containing list of visible windows
     """
-    inspector = GUIInspector()
-    return inspector.list_all_windows()
+    return _get_inspector().list_all_windows()
 
 
-def screenshot_window(window_title: str = None) -> dict:
+def screenshot_window(window_title: str = None, reuse: bool = False, max_dim: int = None) -> dict:
     """Take a screenshot of a specific window.
     
     Args:
         window_title: Optional title of the window to screenshot
+        reuse: Without a title, reuse the last inspected window if it is still open and
+            active, skipping the lookup; by default the active window is looked up
+        max_dim: Optional limit on the longer side in pixels; larger captures are downscaled
         
     Returns:
         Dictionary containing screenshot result
     """
-    inspector = GUIInspector()
-    return inspector.get_window_screenshot(window_title)
+    return _get_inspector().get_window_screenshot(window_title, reuse=reuse, max_dim=max_dim)
 
 
 # Utility function to register all GUI inspector tools with the agent
@@ -400,4 +470,5 @@ def register_gui_inspector_tools(agent):
     ]
     
     for name, func, desc in gui_tools:
-        agent.add_tool(name, func, desc)
\ No newline at end of file
+        # Screenshots bring their window to the front, so they keep their place in line
+        agent.add_tool(name, func, desc, ordered=name == "screenshot_window")
\ No newline at end of file
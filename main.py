@@ -7,67 +7,124 @@ import asyncio
 import os
 import sys
 from pathlib import Path
+from typing import AsyncIterator, Dict, List, Tuple
 
 # Import our agent foundation and tools
 from agent import PyMOLAgent
-from pymol_tools import register_pymol_tools
+from config import get_api_key
+from embeddings import EMBEDDINGS_AVAILABLE, get_embedding_model
+from pymol_tools import register_pymol_tools, warm_up_session
 from vision_tools import register_vision_tools
 from desktop_tools import register_desktop_tools
 from gui_inspector import register_gui_inspector_tools
 
+try:
+    from prompt_toolkit import PromptSession
+    PROMPT_TOOLKIT_AVAILABLE = True
+except ImportError:
+    PROMPT_TOOLKIT_AVAILABLE = False
+
+try:
+    import uvloop
+    UVLOOP_AVAILABLE = True
+except ImportError:
+    UVLOOP_AVAILABLE = False
+
+
+# Bytes read from stdin past the end of the last line returned by _read_line
+_stdin_buffer = bytearray()
+
+
+async def _read_line(prompt: str) -> str:
+    """Read a line from stdin without blocking the event loop.
+    
+    Where the loop can watch stdin, the line is read once stdin is readable,
+    so cancelling the session leaves no thread blocked in input() for
+    shutdown to wait on. Other loops (the Windows proactor loop) fall back to
+    input() in a worker thread. Raises EOFError at end of input.
+    """
+    loop = asyncio.get_running_loop()
+    print(prompt, end="", flush=True)
+    while b"\n" not in _stdin_buffer:
+        readable = loop.create_future()
+        try:
+            fd = sys.stdin.fileno()
+            loop.add_reader(fd, lambda: readable.done() or readable.set_result(None))
+        except (AttributeError, ValueError, OSError, NotImplementedError):
+            return await asyncio.to_thread(input)
+        try:
+            await readable
+        finally:
+            loop.remove_reader(fd)
+        chunk = os.read(fd, 4096)
+        if not chunk:
+            if not _stdin_buffer:
+                raise EOFError
+            break
+        _stdin_buffer.extend(chunk)
+    line, _, rest = bytes(_stdin_buffer).partition(b"\n")
+    _stdin_buffer[:] = rest
+    return line.decode(sys.stdin.encoding or "utf-8", errors="replace")
+
+
+# System instruction for the integrated agent, defined once rather than per agent
+SYSTEM_INSTRUCTION = """You are the PyMOL Learning Agent - an advanced AI assistant designed to help users
+understand and control PyMOL molecular visualization software through natural language.
+
+CORE CAPABILITIES:
+- Molecular visualization and analysis using PyMOL
+- Vision analysis of molecular images
+- Desktop automation for GUI interactions
+- GUI inspection and accessibility
+- Memory management for contextual conversations
+
+AVAILABLE TOOLS:
+1. PyMOL Tools: Execute commands, load structures, set representations, color molecules
+2. Vision Tools: Analyze images, annotate, compare molecular visualizations
+3. Desktop Tools: Control mouse/keyboard, manage windows, take screenshots
+4. GUI Inspector: Examine interface elements, find clickable elements
+
+WORKFLOW PRINCIPLES:
+1. Always understand the user's intent before taking action
+2. Use vision tools when analyzing molecular structures or screenshots
+3. Use desktop tools when you need to interact with PyMOL's GUI directly
+4. Use GUI inspector to understand the current interface state
+5. Remember previous interactions to provide contextual assistance
+6. Explain your actions and reasoning to the user
+
+BEST PRACTICES:
+- Start by asking clarifying questions if the user's request is ambiguous
+- Use screenshots and vision analysis to understand the current state
+- Combine multiple tools when necessary (e.g., screenshot + vision analysis)
+- Provide educational explanations alongside technical actions
+- Remember molecular structures and preferences for future sessions
+
+SAFETY:
+- Always ask for confirmation before performing destructive operations
+- Warn users before overwriting files or making significant changes
+- Ensure PyMOL commands are safe and won't crash the application
+
+Your goal is to make PyMOL accessible and educational for users at all levels."""
+
 
 class IntegratedPyMOLAgent:
     """Complete PyMOL Learning Agent with all tools integrated."""
     
-    def __init__(self, api_key: str = None, model: str = "gemini-2.5-pro"):
+    def __init__(self, api_key: str = None, model: str = "gemini-2.5-pro",
+                 cache_responses: bool = True):
         """Initialize the integrated agent with all tools."""
         
         # Initialize the base agent
-        self.agent = PyMOLAgent(api_key=api_key, model=model)
+        self.agent = PyMOLAgent(api_key=api_key, model=model, cache_responses=cache_responses)
+        
+        # Requests currently waiting on Gemini, keyed by (input, temperature, stateless)
+        self._in_flight: Dict[Tuple[str, float, bool], asyncio.Future] = {}
         
         # Register all tool categories
         self._register_all_tools()
         
         # Enhanced system instruction for the integrated agent
-        self.agent.system_instruction = """
-        You are the PyMOL Learning Agent - an advanced AI assistant designed to help users 
-        understand and control PyMOL molecular visualization software through natural language.
-        
-        CORE CAPABILITIES:
-        - Molecular visualization and analysis using PyMOL
-        - Vision analysis of molecular images
-        - Desktop automation for GUI interactions
-        - GUI inspection and accessibility
-        - Memory management for contextual conversations
-        
-        AVAILABLE TOOLS:
-        1. PyMOL Tools: Execute commands, load structures, set representations, color molecules
-        2. Vision Tools: Analyze images, annotate, compare molecular visualizations
-        3. Desktop Tools: Control mouse/keyboard, manage windows, take screenshots
-        4. GUI Inspector: Examine interface elements, find clickable elements
-        
-        WORKFLOW PRINCIPLES:
-        1. Always understand the user's intent before taking action
-        2. Use vision tools when analyzing molecular structures or screenshots
-        3. Use desktop tools when you need to interact with PyMOL's GUI directly
-        4. Use GUI inspector to understand the current interface state
-        5. Remember previous interactions to provide contextual assistance
-        6. Explain your actions and reasoning to the user
-        
-        BEST PRACTICES:
-        - Start by asking clarifying questions if the user's request is ambiguous
-        - Use screenshots and vision analysis to understand the current state
-        - Combine multiple tools when necessary (e.g., screenshot + vision analysis)
-        - Provide educational explanations alongside technical actions
-        - Remember molecular structures and preferences for future sessions
-        
-        SAFETY:
-        - Always ask for confirmation before performing destructive operations
-        - Warn users before overwriting files or making significant changes
-        - Ensure PyMOL commands are safe and won't crash the application
-        
-        Your goal is to make PyMOL accessible and educational for users at all levels.
-        """
+        self.agent.system_instruction = SYSTEM_INSTRUCTION
     
     def _register_all_tools(self):
         """Register all tool categories with the agent."""
@@ -85,9 +142,53 @@ class IntegratedPyMOLAgent:
         
         print(f"✓ All tools registered. Total tools: {len(self.agent.tool_registry.tools)}")
     
-    async def process_request(self, user_input: str, temperature: float = 0.1) -> str:
-        """Process a user request with full agent capabilities."""
-        return await self.agent.process_message(user_input, temperature)
+    async def process_request(self, user_input: str, temperature: float = 0.1,
+                              stateless: bool = False) -> str:
+        """Process a user request with full agent capabilities.
+        
+        Repeated and near-duplicate requests are answered from the base
+        agent's response cache without a Gemini call, as long as the model,
+        system instruction, tools, temperature and recent conversation match.
+        A stateless request is sent without the recent conversation, so only
+        the rest has to match. Identical requests that arrive while one is
+        still in flight share its Gemini call instead of each making their own.
+        """
+        key = (user_input, temperature, stateless)
+        pending = self._in_flight.get(key)
+        if pending is None:
+            pending = asyncio.ensure_future(
+                self.agent.process_message(user_input, temperature, stateless))
+            self._in_flight[key] = pending
+            pending.add_done_callback(lambda _: self._in_flight.pop(key, None))
+        # Shielded so one caller giving up doesn't cancel the call for the others
+        return await asyncio.shield(pending)
+    
+    async def process_request_stream(self, user_input: str,
+                                     temperature: float = 0.1) -> AsyncIterator[str]:
+        """Process a user request, yielding response text as it is generated.
+        
+        The complete response is cached and remembered once the stream ends,
+        just as with process_request.
+        """
+        async for chunk in self.agent.stream_message(user_input, temperature):
+            yield chunk
+    
+    async def _warm_up(self):
+        """Pay one-time startup costs in the background.
+        
+        Opens the Gemini connection with a model lookup (no tokens are
+        generated), loads the embedding model used by memory search and the
+        response cache, and starts the PyMOL session. Failures are ignored;
+        the first real request simply pays that cost instead.
+        """
+        steps = [
+            lambda: self.agent.client.models.get(model=self.agent.model),
+            warm_up_session,
+        ]
+        if EMBEDDINGS_AVAILABLE:
+            steps.append(get_embedding_model)
+        await asyncio.gather(*(asyncio.to_thread(step) for step in steps),
+                             return_exceptions=True)
     
     def get_agent_status(self) -> str:
         """Get comprehensive status of the agent."""
@@ -101,15 +202,28 @@ Temperature: {0.1}
 System Ready: ✓"""
     
     async def interactive_session(self):
-        """Start an interactive session with the agent."""
+        """Start an interactive session with the agent.
+        
+        Input is read without blocking the event loop, so background work
+        (memory writes, in-flight requests) keeps running while the user types.
+        """
         print("=" * 60)
         print("PyMOL Learning Agent - Interactive Session")
         print("Type 'quit' to exit, 'status' for agent status")
         print("=" * 60)
         
+        prompt_session = PromptSession() if PROMPT_TOOLKIT_AVAILABLE else None
+        
+        # Runs while the user types their first message, which no longer pays for it
+        warmup = asyncio.create_task(self._warm_up())
+        
         while True:
             try:
-                user_input = input("\nYou: ").strip()
+                if prompt_session is not None:
+                    print()
+                    user_input = (await prompt_session.prompt_async("You: ")).strip()
+                else:
+                    user_input = (await _read_line("\nYou: ")).strip()
                 
                 if user_input.lower() in ['quit', 'exit', 'q']:
                     print("Goodbye!")
@@ -123,18 +237,43 @@ System Ready: ✓"""
                     continue
                 
                 print("Agent: ", end="", flush=True)
-                response = await self.process_request(user_input)
-                print(response)
+                async for chunk in self.process_request_stream(user_input):
+                    print(chunk, end="", flush=True)
+                print()
                 
             except KeyboardInterrupt:
                 print("\nSession interrupted. Type 'quit' to exit.")
+            except EOFError:
+                # Ctrl-D, or stdin closed
+                print("\nGoodbye!")
+                break
+            except asyncio.CancelledError:
+                # Under asyncio.run, Ctrl-C cancels this task instead of raising
+                # KeyboardInterrupt at the await
+                print("\nSession interrupted.")
+                break
             except Exception as e:
                 print(f"\nError: {e}")
+        
+        warmup.cancel()
 
 
 # Demo and testing functions
-async def demo_basic_functionality():
-    """Demonstrate basic agent functionality."""
+def _report(label: str, results: List[Dict[str, str]]):
+    """Print demo exchanges in the order the queries were listed."""
+    for i, result in enumerate(results, 1):
+        print(f"\n--- {label} {i} ---")
+        print(f"User: {result['query']}")
+        print(f"Agent: {result['response']}")
+
+
+async def demo_basic_functionality() -> List[Dict[str, str]]:
+    """Demonstrate basic agent functionality.
+    
+    Returns the exchanges as {"query", "response"} dicts. The queries are
+    sent as stateless requests, so their answers are cached independently of
+    the conversation and a rerun answers them without calling Gemini.
+    """
     print("🧪 Running basic functionality demo...")
     
     agent = IntegratedPyMOLAgent()
@@ -148,16 +287,23 @@ async def demo_basic_functionality():
         "Can you help me understand molecular representations?"
     ]
     
-    for i, query in enumerate(demo_queries, 1):
-        print(f"\n--- Query {i} ---")
-        print(f"User: {query}")
-        print("Agent: ", end="", flush=True)
-        response = await agent.process_request(query)
-        print(response)
+    # The queries don't depend on each other, so they go to Gemini together;
+    # the agent caps how many requests are in flight at once
+    responses = await asyncio.gather(*(agent.process_request(query, stateless=True)
+                                       for query in demo_queries))
+    
+    results = [{"query": query, "response": response}
+               for query, response in zip(demo_queries, responses)]
+    _report("Query", results)
+    return results
 
 
-async def demo_tool_integration():
-    """Demonstrate tool integration capabilities."""
+async def demo_tool_integration() -> List[Dict[str, str]]:
+    """Demonstrate tool integration capabilities.
+    
+    Returns the exchanges as {"query", "response"} dicts, like
+    demo_basic_functionality.
+    """
     print("\n🔧 Running tool integration demo...")
     
     agent = IntegratedPyMOLAgent()
@@ -173,18 +319,24 @@ async def demo_tool_integration():
         
         # PyMOL testing
         "What PyMOL command would I use to load a PDB file named 'protein.pdb'?",
-        "How do I set the representation to cartoon in PyMOL?",
-        
-        # Complex workflow
-        "Describe the workflow for loading a protein, setting it to cartoon representation, and coloring it by secondary structure."
+        "How do I set the representation to cartoon in PyMOL?"
     ]
     
-    for i, query in enumerate(test_queries, 1):
-        print(f"\n--- Tool Test {i} ---")
-        print(f"User: {query}")
-        print("Agent: ", end="", flush=True)
-        response = await agent.process_request(query)
-        print(response)
+    # Complex workflow, run after the others since it may build on their PyMOL state
+    workflow_query = (
+        "Describe the workflow for loading a protein, setting it to cartoon representation, "
+        "and coloring it by secondary structure."
+    )
+    
+    # The individual tests are independent, so they run concurrently
+    responses = await asyncio.gather(*(agent.process_request(query, stateless=True)
+                                       for query in test_queries))
+    responses.append(await agent.process_request(workflow_query))
+    
+    results = [{"query": query, "response": response}
+               for query, response in zip(test_queries + [workflow_query], responses)]
+    _report("Tool Test", results)
+    return results
 
 
 async def main():
@@ -202,8 +354,7 @@ async def main():
         mode = mode_map.get(choice, "interactive")
     
     # Check for API key (support both GEMINI_API_KEY and GOOGLE_API_KEY)
-    api_key = os.getenv("GEMINI_API_KEY") or os.getenv("GOOGLE_API_KEY")
-    if not api_key:
+    if not get_api_key():
         print("❌ ERROR: GEMINI_API_KEY or GOOGLE_API_KEY environment variable is required")
         print("Get your API key from: https://aistudio.google.com/apikey")
         print("Set it with: export GEMINI_API_KEY=your_key_here")
@@ -233,4 +384,8 @@ async def main():
 
 
 if __name__ == "__main__":
-    asyncio.run(main())
\ No newline at end of file
+    # uvloop's libuv event loop is a drop-in replacement with cheaper callbacks
+    if UVLOOP_AVAILABLE:
+        uvloop.run(main())
+    else:
+        asyncio.run(main())
\ No newline at end of file
@@ -0,0 +1,119 @@
+"""
+Phase 1: Foundation - Memory Persistence
+This module moves memory file writes off the agent's hot path.
+"""
+
+import atexit
+import json
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, List, Optional, Union
+
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+except ImportError:
+    ORJSON_AVAILABLE = False
+
+
+def dump_jsonl(records: Iterable[Dict[str, Any]]) -> bytes:
+    """Serialize records as compact JSON lines."""
+    if ORJSON_AVAILABLE:
+        return b"".join(orjson.dumps(record, option=orjson.OPT_APPEND_NEWLINE)
+                        for record in records)
+    return "".join(json.dumps(record, separators=(',', ':')) + "\n"
+                   for record in records).encode('utf-8')
+
+
+def load_json(data: Union[bytes, str]) -> Any:
+    """Parse one JSON document."""
+    return orjson.loads(data) if ORJSON_AVAILABLE else json.loads(data)
+
+
+def load_jsonl(data: bytes, path: Optional[Path] = None) -> List[Dict[str, Any]]:
+    """Parse JSON lines, skipping blank lines and lines that aren't JSON objects.
+
+    A crash during an append leaves a torn last line. When `path` is given
+    and such a line was skipped, or the data doesn't end in a newline, the
+    file is rewritten with just the good lines, so the next append starts on
+    a line of its own instead of extending the torn one.
+    """
+    records, good_lines = [], []
+    skipped = 0
+    for line in data.splitlines():
+        if not line.strip():
+            continue
+        try:
+            record = load_json(line)
+        except ValueError:
+            record = None
+        if not isinstance(record, dict):
+            skipped += 1
+            continue
+        records.append(record)
+        good_lines.append(line)
+
+    if skipped:
+        print(f"Warning: skipped {skipped} unreadable line(s) in {path or 'JSON lines data'}")
+    if path is not None and (skipped or (data and not data.endswith(b"\n"))):
+        atomic_write_bytes(path, b"".join(line + b"\n" for line in good_lines))
+    return records
+
+
+def append_jsonl(path: Path, records: Iterable[Dict[str, Any]]):
+    """Append records to a JSON lines file."""
+    with open(path, 'ab') as f:
+        f.write(dump_jsonl(records))
+
+
+def atomic_write_bytes(path: Path, data: bytes):
+    """Write data to a temporary file and swap it into place."""
+    tmp_path = path.with_name(path.name + ".tmp")
+    with open(tmp_path, 'wb') as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+
+
+class AsyncMemoryWriter:
+    """Coalesces memory writes and performs them on a background thread."""
+
+    def __init__(self, write_batch: Callable[[List[Any]], None], debounce: float = 0.5):
+        self._write_batch = write_batch
+        self._debounce = debounce
+        self._pending: List[Any] = []
+        self._pending_lock = threading.Lock()
+        self._write_lock = threading.Lock()
+        self._wakeup = threading.Event()
+
+        self._thread = threading.Thread(target=self._run, name="memory-writer", daemon=True)
+        self._thread.start()
+        atexit.register(self.flush)
+
+    def submit(self, item: Any):
+        """Queue an item; bursts within the debounce window share one write."""
+        with self._pending_lock:
+            self._pending.append(item)
+        self._wakeup.set()
+
+    def flush(self):
+        """Write all pending items now, in submission order."""
+        with self._write_lock:
+            with self._pending_lock:
+                items, self._pending = self._pending, []
+
+            if not items:
+                return
+
+            try:
+                self._write_batch(items)
+            except Exception as e:
+                print(f"Error saving memory: {e}")
+
+    def _run(self):
+        while True:
+            self._wakeup.wait()
+            time.sleep(self._debounce)
+            self._wakeup.clear()
+            self.flush()
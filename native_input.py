@@ -0,0 +1,108 @@
+"""
+Phase 2: Tool Development - Native Input
+This module sends mouse clicks straight to the operating system's input APIs.
+"""
+
+import sys
+import threading
+from typing import Dict, Tuple
+
+WIN32_INPUT = sys.platform == "win32"
+
+if WIN32_INPUT:
+    import ctypes
+    from ctypes import wintypes
+
+    _user32 = ctypes.windll.user32
+
+    class _MOUSEINPUT(ctypes.Structure):
+        _fields_ = [
+            ("dx", wintypes.LONG),
+            ("dy", wintypes.LONG),
+            ("mouseData", wintypes.DWORD),
+            ("dwFlags", wintypes.DWORD),
+            ("time", wintypes.DWORD),
+            ("dwExtraInfo", ctypes.POINTER(wintypes.ULONG)),
+        ]
+
+    class _INPUTUNION(ctypes.Union):
+        # MOUSEINPUT is the largest member, so it alone gives the union its size
+        _fields_ = [("mi", _MOUSEINPUT)]
+
+    class _INPUT(ctypes.Structure):
+        _fields_ = [("type", wintypes.DWORD), ("union", _INPUTUNION)]
+
+    _INPUT_MOUSE = 0
+    _WIN32_BUTTON_FLAGS = {
+        "left": (0x0002, 0x0004),
+        "right": (0x0008, 0x0010),
+        "middle": (0x0020, 0x0040),
+    }
+
+try:
+    from Xlib import X, display as xdisplay
+    from Xlib.ext import xtest
+    XTEST_AVAILABLE = sys.platform.startswith("linux")
+except ImportError:
+    XTEST_AVAILABLE = False
+
+NATIVE_INPUT_AVAILABLE = WIN32_INPUT or XTEST_AVAILABLE
+
+_X_BUTTONS = {"left": 1, "middle": 2, "right": 3}
+
+# Button down/up event arrays, built once per (button, clicks) and reused
+_win32_events: Dict[Tuple[str, int], "ctypes.Array"] = {}
+
+# Xlib connections are not thread-safe, so one shared display is used under a lock
+_x_lock = threading.Lock()
+_x_display = None
+
+
+def _win32_click(x: int, y: int, button: str, clicks: int) -> bool:
+    """Move the cursor and send every button event in one SendInput call."""
+    flags = _WIN32_BUTTON_FLAGS.get(button)
+    if flags is None:
+        return False
+
+    events = _win32_events.get((button, clicks))
+    if events is None:
+        events = (_INPUT * (2 * clicks))()
+        for i in range(2 * clicks):
+            events[i].type = _INPUT_MOUSE
+            events[i].union.mi.dwFlags = flags[i % 2]
+        _win32_events[(button, clicks)] = events
+
+    _user32.SetCursorPos(x, y)
+    sent = _user32.SendInput(len(events), events, ctypes.sizeof(_INPUT))
+    return sent == len(events)
+
+
+def _xtest_click(x: int, y: int, button: str, clicks: int) -> bool:
+    """Move the pointer and press/release the button through the XTest extension."""
+    global _x_display
+    code = _X_BUTTONS.get(button)
+    if code is None:
+        return False
+
+    with _x_lock:
+        if _x_display is None:
+            _x_display = xdisplay.Display()
+        xtest.fake_input(_x_display, X.MotionNotify, x=x, y=y)
+        for _ in range(clicks):
+            xtest.fake_input(_x_display, X.ButtonPress, code)
+            xtest.fake_input(_x_display, X.ButtonRelease, code)
+        _x_display.sync()
+    return True
+
+
+def native_click(x: int, y: int, button: str = "left", clicks: int = 1) -> bool:
+    """Click at screen coordinates without going through pyautogui.
+
+    Returns False when there is no native path for this platform or button,
+    so the caller can fall back to pyautogui.
+    """
+    if WIN32_INPUT:
+        return _win32_click(x, y, button, clicks)
+    if XTEST_AVAILABLE:
+        return _xtest_click(x, y, button, clicks)
+    return False
@@ -3,50 +3,299 @@ Phase 2: Tool Development - PyMOL Command Executor Tool
 This module provides tools for executing PyMOL commands and operations.
 """
 
+import atexit
+import contextlib
+import copy
+import io
 import subprocess
-import json
 import os
-from typing import Dict, Any, Optional
+import re
+import sys
+import threading
+import time
+from typing import Callable, Dict, Any, Optional
 from pathlib import Path
 
+try:
+    import pymol2
+    PYMOL_SESSION_AVAILABLE = True
+except ImportError:
+    PYMOL_SESSION_AVAILABLE = False
+
+try:
+    import numpy as np
+    NUMPY_AVAILABLE = True
+except ImportError:
+    NUMPY_AVAILABLE = False
+
+
+# One in-process PyMOL instance serves every command, so no call pays for
+# starting a PyMOL process. PyMOL's API is not thread-safe and tools run on
+# worker threads, so all access goes through _session_lock
+_session = None
+_session_lock = threading.RLock()
+
+
+def _get_session():
+    """Return the shared PyMOL instance, starting it on first use."""
+    global _session
+    with _session_lock:
+        if _session is None:
+            session = pymol2.PyMOL()
+            session.start()
+            atexit.register(session.stop)
+            _session = session
+        return _session
+
+
+def warm_up_session():
+    """Start the shared PyMOL session ahead of the first command, when pymol2 is available."""
+    if PYMOL_SESSION_AVAILABLE:
+        _get_session()
+
+
+# Results of read-only commands are reused for this many seconds, unless a
+# command that may change the session runs first
+QUERY_CACHE_TTL = 60.0
+QUERY_CACHE_SIZE = 512
+
+# Commands (and cmd.* calls inside print statements) with these prefixes only read state
+_READ_ONLY_PREFIXES = ("get_", "count_", "iterate")
+_CMD_CALL = re.compile(r"\bcmd\.(\w+)")
+
+
+def _is_read_only(command: str) -> bool:
+    """Return True if every line of the command only queries the session."""
+    if ";" in command:
+        # PyMOL chains commands with semicolons; don't try to split them safely
+        return False
+    lines = [line.strip() for line in command.splitlines() if line.strip()]
+    for line in lines:
+        if line.startswith("print("):
+            names = _CMD_CALL.findall(line)
+            if not names or not all(name.startswith(_READ_ONLY_PREFIXES) for name in names):
+                return False
+        elif not line.split()[0].startswith(_READ_ONLY_PREFIXES):
+            return False
+    return bool(lines)
+
+
+# PyMOL's parser reports failures as output instead of raising: "Error: ..."
+# or "<Module>-Error: ..." lines, or a Python traceback
+_FAILURE_LINE = re.compile(r"^\s*(?:[\w-]+-)?Error:.*$|^Traceback \(most recent call last\):", re.M)
+
+
+class _ThreadOutput:
+    """Stand-in for sys.stdout/sys.stderr that diverts one thread's writes to a buffer.
+    
+    Swapping sys.stdout for the length of a command would also capture
+    whatever other threads print meanwhile; here only writes from the thread
+    running the command are captured and the rest pass through.
+    """
+    
+    def __init__(self, stream):
+        self._stream = stream
+        self._local = threading.local()
+    
+    def _target(self):
+        buffer = getattr(self._local, "buffer", None)
+        return self._stream if buffer is None else buffer
+    
+    def write(self, text):
+        return self._target().write(text)
+    
+    def flush(self):
+        self._target().flush()
+    
+    def __getattr__(self, name):
+        return getattr(self._stream, name)
+
+
+@contextlib.contextmanager
+def _capture_thread_output(buffer: io.StringIO):
+    """Collect this thread's stdout and stderr writes in buffer. Call with _session_lock held."""
+    streams = []
+    for name in ("stdout", "stderr"):
+        stream = getattr(sys, name)
+        if not isinstance(stream, _ThreadOutput):
+            stream = _ThreadOutput(stream)
+            setattr(sys, name, stream)
+        streams.append(stream)
+    for stream in streams:
+        stream._local.buffer = buffer
+    try:
+        yield
+    finally:
+        for stream in streams:
+            stream._local.buffer = None
+
+
+def _run_in_session(cmd, command: str):
+    """Run a PyMOL command through the parser, or Python statements directly.
+    
+    Python runs with `cmd` in scope, outside the parser, so its exceptions
+    reach the caller instead of being printed.
+    """
+    words = command.split(None, 1)
+    if not words or words[0] not in cmd.keyword:
+        try:
+            code = compile(command, "<command>", "exec")
+        except SyntaxError:
+            code = None
+        if code is not None:
+            exec(code, {"cmd": cmd})
+            return
+    cmd.do(command, echo=0)
+
+
+# Render images with OpenGL (draw) instead of the CPU ray tracer; needs a GL
+# context, which a headless PyMOL session doesn't have
+GPU_RENDER = os.getenv("AGENT_GPU_RENDER", "0") == "1"
+
+# Representations accepted by set_representation
+_VALID_REPS = frozenset({"lines", "sticks", "spheres", "surface", "cartoon", "ribbon"})
+
 
 class PyMOLCommandExecutor:
     """Handles execution of PyMOL commands and manages PyMOL sessions."""
     
     def __init__(self, pymol_path: str = None):
         self.pymol_path = pymol_path or os.getenv("PYMOL_PATH", "pymol")
-        self.session_active = False
+        self.session_active = PYMOL_SESSION_AVAILABLE
         self.current_session = None
+        # Bumped by every command that may change the session; cached query
+        # results are keyed by the generation they were read in
+        self._generation = 0
+        self._query_cache: Dict[tuple, tuple] = {}
+        self._cache_lock = threading.Lock()
+    
+    @property
+    def session(self):
+        """The in-process PyMOL instance, started on first access."""
+        if self.current_session is None:
+            self.current_session = _get_session()
+        return self.current_session
     
     def execute_command(self, command: str) -> Dict[str, Any]:
-        """Execute a PyMOL command and return the result."""
+        """Execute a PyMOL command and return the result.
+        
+        Commands run in the shared in-process PyMOL session when pymol2 is
+        importable, and in a one-off `pymol -cq` process otherwise.
+        """
+        if self.session_active:
+            return self._cached(command, lambda: self._execute_in_session(command))
+        return self._cached(command, lambda: self._execute_in_subprocess(command))
+    
+    def _cached(self, command: str, run: Callable[[], Dict[str, Any]],
+                query: tuple = None) -> Dict[str, Any]:
+        """Serve read-only commands from the query cache; invalidate it on anything else.
+        
+        Queries made through the API rather than a command string pass their
+        own `query` key, so they can't share an entry with a command.
+        """
+        if query is None and not _is_read_only(command):
+            try:
+                return run()
+            finally:
+                self._invalidate()
+        
+        key = (query or command, self._generation)
+        with self._cache_lock:
+            entry = self._query_cache.get(key)
+        if entry is not None and time.monotonic() - entry[0] <= QUERY_CACHE_TTL:
+            # Entries are stored and served as deep copies, so a caller editing
+            # nested values can't change what later calls see
+            result = copy.deepcopy(entry[1])
+            result["cached"] = True
+            return result
+        
+        result = run()
+        if result.get("success"):
+            with self._cache_lock:
+                self._query_cache.pop(key, None)
+                self._query_cache[key] = (time.monotonic(), copy.deepcopy(result))
+                if len(self._query_cache) > QUERY_CACHE_SIZE:
+                    # Dicts keep insertion order, so the first key is the oldest entry
+                    del self._query_cache[next(iter(self._query_cache))]
+        return result
+    
+    def _invalidate(self):
+        """Start a new session generation, dropping all cached query results."""
+        with self._cache_lock:
+            self._generation += 1
+            self._query_cache.clear()
+    
+    def _execute_in_session(self, command: str) -> Dict[str, Any]:
+        """Run a command in the shared session.
+        
+        Accepts both PyMOL commands and Python statements (with `cmd` in
+        scope), the same inputs the script-based path accepted. The command
+        fails if it raises, or if its output or PyMOL's feedback has an error.
+        """
+        output = io.StringIO()
         try:
-            # Create PyMOL script
-            script_content = f"""
-import sys
+            with _session_lock:
+                cmd = self.session.cmd
+                # Discard feedback left over from earlier calls
+                cmd.get_feedback()
+                with _capture_thread_output(output):
+                    _run_in_session(cmd, command)
+                feedback = cmd.get_feedback() or []
+        except Exception as e:
+            return {
+                "success": False,
+                "error": str(e),
+                "output": output.getvalue(),
+                "command": command
+            }
+        
+        text = output.getvalue() + "".join(f"{line}\n" for line in feedback)
+        failure = _FAILURE_LINE.search(text)
+        if failure:
+            error = failure.group(0)
+            if error.startswith("Traceback"):
+                # The exception itself is on the traceback's last line
+                error = text.strip().splitlines()[-1]
+            return {
+                "success": False,
+                "error": error.strip(),
+                "output": text,
+                "command": command
+            }
+        return {
+            "success": True,
+            "output": text,
+            "command": command
+        }
+    
+    def _execute_in_subprocess(self, command: str) -> Dict[str, Any]:
+        """Run a command in a fresh PyMOL process, sending the script over stdin.
+        
+        Nothing touches the filesystem, so concurrent calls can't overwrite
+        each other's script the way a shared temporary file could.
+        """
+        try:
+            # PyMOL reads commands from stdin with -p; the Python code runs in
+            # a python/python end block and the process quits at the end
+            script_content = f"""python
 try:
     {command}
     print("SUCCESS: Command executed")
 except Exception as e:
     print(f"ERROR: {{e}}")
-    sys.exit(1)
+    cmd.quit(1)
+python end
+quit
 """
             
-            # Write to temporary script file
-            script_file = Path("/tmp/pymol_script.py")
-            script_file.write_text(script_content)
-            
-            # Execute PyMOL with the script
             result = subprocess.run(
-                [self.pymol_path, "-cq", str(script_file)],
+                [self.pymol_path, "-cqp"],
+                input=script_content,
                 capture_output=True,
                 text=True,
                 timeout=30
             )
             
-            # Clean up
-            script_file.unlink(missing_ok=True)
-            
             if result.returncode == 0:
                 return {
                     "success": True,
@@ -56,7 +305,7 @@ except Exception as e:
             else:
                 return {
                     "success": False,
-                    "error": result.stderr,
+                    "error": result.stderr or result.stdout,
                     "command": command
                 }
                 
@@ -86,16 +335,35 @@ except Exception as e:
     
     def get_object_list(self) -> Dict[str, Any]:
         """Get list of objects currently loaded in PyMOL."""
-        command = "print(cmd.get_object_list())"
-        return self.execute_command(command)
+        if not self.session_active:
+            return self.execute_command("print(cmd.get_object_list())")
+        
+        return self._cached("get_object_list", self._list_session_objects, query=("__objects__",))
+    
+    def _list_session_objects(self) -> Dict[str, Any]:
+        """Ask the session for its objects directly rather than printing and capturing the list."""
+        command = "get_object_list"
+        try:
+            with _session_lock:
+                objects = self.session.cmd.get_object_list()
+            return {
+                "success": True,
+                "objects": objects,
+                "command": command
+            }
+        except Exception as e:
+            return {
+                "success": False,
+                "error": str(e),
+                "command": command
+            }
     
     def set_representation(self, object_name: str, representation: str) -> Dict[str, Any]:
         """Set molecular representation for an object."""
-        valid_reps = ["lines", "sticks", "spheres", "surface", "cartoon", "ribbon"]
-        if representation.lower() not in valid_reps:
+        if representation.lower() not in _VALID_REPS:
             return {
                 "success": False,
-                "error": f"Invalid representation. Valid options: {valid_reps}"
+                "error": f"Invalid representation. Valid options: {sorted(_VALID_REPS)}"
             }
         
         command = f'show {representation}, {object_name}'
@@ -114,7 +382,30 @@ except Exception as e:
     def save_image(self, filename: str, width: int = 800, height: int = 600) -> Dict[str, Any]:
         """Save current PyMOL view as an image."""
         command = f'png {filename}, {width}, {height}'
-        return self.execute_command(command)
+        if not self.session_active:
+            return self.execute_command(command)
+        
+        try:
+            with _session_lock:
+                if GPU_RENDER:
+                    # Antialiased OpenGL render at the requested size, no ray tracing
+                    self.session.cmd.draw(width, height, antialias=2)
+                    self.session.cmd.png(filename)
+                else:
+                    self.session.cmd.png(filename, width, height, ray=1)
+            return {
+                "success": True,
+                "filename": filename,
+                "size": (width, height),
+                "renderer": "opengl" if GPU_RENDER else "ray",
+                "command": command
+            }
+        except Exception as e:
+            return {
+                "success": False,
+                "error": str(e),
+                "command": command
+            }
     
     def get_selection_info(self, selection: str = "all") -> Dict[str, Any]:
         """Get information about a selection."""
@@ -123,7 +414,71 @@ print(f"Number of atoms: {{cmd.count_atoms()}}")
 print(f"Number of bonds: {{cmd.count_bonds()}}")
 print(f"Center of mass: {{cmd.get_center_of_mass()}}")
 '''
-        return self.execute_command(command)
+        if not (self.session_active and NUMPY_AVAILABLE):
+            return self.execute_command(command)
+        
+        return self._cached(f"get_selection_info {selection}",
+                            lambda: self._measure_selection(selection),
+                            query=("__selection__", selection))
+    
+    def _measure_selection(self, selection: str) -> Dict[str, Any]:
+        """Measure a selection from its coordinate and mass arrays in the session."""
+        command = f"get_selection_info {selection}"
+        try:
+            with _session_lock:
+                coords = self.session.cmd.get_coords(selection)
+                model = self.session.cmd.get_model(selection)
+            
+            if coords is None or not len(model.atom):
+                return {
+                    "success": False,
+                    "error": f"Selection matches no atoms: {selection}",
+                    "command": command
+                }
+            
+            masses = np.fromiter((atom.get_mass() for atom in model.atom),
+                                 dtype=np.float64, count=len(model.atom))
+            center, radius = _mass_moments(coords, masses)
+            return {
+                "success": True,
+                "selection": selection,
+                "atom_count": len(model.atom),
+                "bond_count": len(model.bond),
+                "center_of_mass": center,
+                "radius_of_gyration": radius,
+                "command": command
+            }
+        except Exception as e:
+            return {
+                "success": False,
+                "error": str(e),
+                "command": command
+            }
+
+
+def _mass_moments(coords: "np.ndarray", masses: "np.ndarray"):
+    """Return the center of mass and radius of gyration of (N, 3) coordinates.
+    
+    Both are whole-array reductions, so the cost per atom is a few vector
+    operations in C rather than a Python loop.
+    """
+    total = masses.sum()
+    center = masses @ coords / total
+    offsets = coords - center
+    radius = float(np.sqrt(masses @ np.einsum("ij,ij->i", offsets, offsets) / total))
+    return center.tolist(), radius
+
+
+# Shared executor so every tool call reuses the same session handle
+_executor: Optional[PyMOLCommandExecutor] = None
+
+
+def _get_executor() -> PyMOLCommandExecutor:
+    """Return the module-wide PyMOLCommandExecutor, creating it on first use."""
+    global _executor
+    if _executor is None:
+        _executor = PyMOLCommandExecutor()
+    return _executor
 
 
 # PyMOL tool functions for the agent
@@ -136,8 +491,7 @@ def execute_pymol_command(command: str) -> dict:
     Returns:
         Dictionary containing success status and result/error message
     """
-    executor = PyMOLCommandExecutor()
-    return executor.execute_command(command)
+    return _get_executor().execute_command(command)
 
 
 def load_molecule(file_path: str) -> dict:
@@ -149,8 +503,7 @@ def load_molecule(file_path: str) -> dict:
     Returns:
         Dictionary containing success status and result/error message
     """
-    executor = PyMOLCommandExecutor()
-    return executor.load_structure(file_path)
+    return _get_executor().load_structure(file_path)
 
 
 def set_molecular_representation(object_name: str, representation: str) -> dict:
@@ -163,8 +516,7 @@ def set_molecular_representation(object_name: str, representation: str) -> dict:
     Returns:
         Dictionary containing success status and result/error message
     """
-    executor = PyMOLCommandExecutor()
-    return executor.set_representation(object_name, representation)
+    return _get_executor().set_representation(object_name, representation)
 
 
 def color_molecule(object_name: str, color: str) -> dict:
@@ -177,8 +529,7 @@ def color_molecule(object_name: str, color: str) -> dict:
     Returns:
         Dictionary containing success status and result/error message
     """
-    executor = PyMOLCommandExecutor()
-    return executor.color_object(object_name, color)
+    return _get_executor().color_object(object_name, color)
 
 
 def zoom_to_object(object_name: str) -> dict:
@@ -190,8 +541,7 @@ def zoom_to_object(object_name: str) -> dict:
     Returns:
         Dictionary containing success status and result/error message
     """
-    executor = PyMOLCommandExecutor()
-    return executor.zoom_object(object_name)
+    return _get_executor().zoom_object(object_name)
 
 
 def save_view_image(filename: str, width: int = 800, height: int = 600) -> dict:
@@ -205,8 +555,7 @@ def save_view_image(filename: str, width: int = 800, height: int = 600) -> dict:
     Returns:
         Dictionary containing success status and result/error message
     """
-    executor = PyMOLCommandExecutor()
-    return executor.save_image(filename, width, height)
+    return _get_executor().save_image(filename, width, height)
 
 
 def get_molecule_info(selection: str = "all") -> dict:
@@ -218,8 +567,7 @@ def get_molecule_info(selection: str = "all") -> dict:
     Returns:
         Dictionary containing molecular information
     """
-    executor = PyMOLCommandExecutor()
-    return executor.get_selection_info(selection)
+    return _get_executor().get_selection_info(selection)
 
 
 def list_loaded_objects() -> dict:
@@ -228,8 +576,14 @@ def list_loaded_objects() -> dict:
     Returns:
         Dictionary containing list of loaded objects
     """
-    executor = PyMOLCommandExecutor()
-    return executor.get_object_list()
+    return _get_executor().get_object_list()
+
+
+# Tools that change the PyMOL session; the agent runs their calls in order
+_ORDERED_TOOLS = frozenset({
+    "execute_pymol_command", "load_molecule", "set_molecular_representation",
+    "color_molecule", "zoom_to_object", "save_view_image"
+})
 
 
 # Utility function to register all PyMOL tools with the agent
@@ -255,4 +609,4 @@ def register_pymol_tools(agent):
     ]
     
     for name, func, desc in pymol_tools:
-        agent.add_tool(name, func, desc)
\ No newline at end of file
+        agent.add_tool(name, func, desc, ordered=name in _ORDERED_TOOLS)
\ No newline at end of file
@@ -0,0 +1,141 @@
+"""
+Phase 1: Foundation - Response Cache
+This module memoizes model responses so repeated questions skip the Gemini call.
+"""
+
+import hashlib
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from embeddings import (
+    EMBEDDINGS_AVAILABLE, EMBEDDING_FORMAT, VectorIndex,
+    decode_vectors, embed_query, embed_texts, encode_vector
+)
+from memory_writer import AsyncMemoryWriter, append_jsonl, load_jsonl
+
+
+def hash_key(*parts: str) -> str:
+    """Hash text parts into a compact cache key."""
+    digest = hashlib.sha1()
+    for part in parts:
+        digest.update(part.encode('utf-8'))
+        digest.update(b'\0')
+    return digest.hexdigest()
+
+
+@dataclass
+class CachedResponse:
+    """A cached model response and the message that produced it."""
+    message: str
+    response: str
+    row: Optional[int] = field(default=None, repr=False, compare=False)
+
+
+class ResponseCache:
+    """Caches model responses for exact and near-duplicate messages.
+
+    Lookups are confined to a scope: a hash of everything else that shapes
+    the response (model, system instruction, tools, temperature and prior
+    conversation), so a hit only happens when the model would see the same
+    situation.
+    """
+
+    def __init__(self, cache_file: str = "response_cache.jsonl",
+                 similarity_threshold: float = 0.97):
+        self.cache_file = Path(cache_file)
+        self.similarity_threshold = similarity_threshold
+        self.exact: Dict[str, CachedResponse] = {}
+        self.semantic: Dict[str, VectorIndex] = {}
+        self._semantic_enabled = EMBEDDINGS_AVAILABLE
+        self._writer = AsyncMemoryWriter(self._write_records)
+        self._load()
+
+    def get(self, scope: str, message: str) -> Optional[str]:
+        """Return a cached response for the message within a scope, if any."""
+        entry = self.exact.get(hash_key(scope, message))
+        if entry is not None:
+            return entry.response
+
+        index = self.semantic.get(scope)
+        if not self._semantic_enabled or index is None or not len(index):
+            return None
+
+        try:
+            hits = index.search(embed_query(message), 1, self.similarity_threshold)
+        except Exception as e:
+            print(f"Semantic cache lookup failed: {e}")
+            return None
+
+        return hits[0][0].response if hits else None
+
+    def put(self, scope: str, message: str, response: str):
+        """Cache a response and append it to the cache file."""
+        key = hash_key(scope, message)
+        if key in self.exact:
+            return
+
+        entry = CachedResponse(message=message, response=response)
+        self.exact[key] = entry
+        self._index(scope, [entry])
+
+        record = {'scope': scope, 'message': message, 'response': response}
+        index = self.semantic.get(scope)
+        vector = index.get_vector(entry) if index is not None else None
+        if vector is not None:
+            record['embedding'] = encode_vector(vector)
+            record['model'] = EMBEDDING_FORMAT
+        self._writer.submit(record)
+
+    def flush(self):
+        """Block until all queued cache writes are on disk."""
+        self._writer.flush()
+
+    def _index(self, scope: str, entries: List[CachedResponse], vectors=None):
+        """Add entries to the scope's near-duplicate index."""
+        if not self._semantic_enabled or not entries:
+            return
+
+        try:
+            if vectors is None:
+                vectors = embed_texts([entry.message for entry in entries])
+            self.semantic.setdefault(scope, VectorIndex()).add(vectors, entries)
+        except Exception as e:
+            print(f"Error embedding cached message, using exact matches only: {e}")
+            self._semantic_enabled = False
+
+    def _load(self):
+        """Load cached responses from the cache file."""
+        if not self.cache_file.exists():
+            return
+
+        stored: Dict[str, List[Any]] = {}
+        try:
+            with open(self.cache_file, 'rb') as f:
+                # Torn or malformed lines are skipped, and the file repaired
+                records = load_jsonl(f.read(), self.cache_file)
+        except Exception as e:
+            print(f"Error loading response cache: {e}")
+            return
+
+        for record in records:
+            try:
+                entry = CachedResponse(message=record['message'], response=record['response'])
+                self.exact[hash_key(record['scope'], entry.message)] = entry
+            except (KeyError, TypeError) as e:
+                print(f"Warning: skipped a malformed response cache record: {e}")
+                continue
+            if record.get('embedding') and record.get('model') == EMBEDDING_FORMAT:
+                stored.setdefault(record['scope'], []).append((entry, record['embedding']))
+
+        for scope, pairs in stored.items():
+            try:
+                vectors = decode_vectors([encoded for _, encoded in pairs])
+            except Exception as e:
+                print(f"Error decoding cached embeddings: {e}")
+                continue
+            self._index(scope, [entry for entry, _ in pairs], vectors)
+
+    def _write_records(self, records: List[Dict[str, Any]]):
+        """Append records to the cache file, one JSON object per line."""
+        append_jsonl(self.cache_file, records)
@@ -0,0 +1,165 @@
+"""
+Phase 2: Tool Development - Screen Capture
+This module grabs screen pixels for the desktop and GUI inspection tools.
+"""
+
+import os
+import threading
+import time
+from typing import Optional, Tuple
+
+try:
+    import mss
+    import mss.tools
+    MSS_AVAILABLE = True
+except ImportError:
+    MSS_AVAILABLE = False
+
+try:
+    from PIL import Image
+    PIL_AVAILABLE = True
+except ImportError:
+    PIL_AVAILABLE = False
+
+try:
+    import numpy as np
+    NUMPY_AVAILABLE = True
+except ImportError:
+    NUMPY_AVAILABLE = False
+
+
+# (left, top, width, height), the same order pyautogui uses for regions
+Region = Tuple[int, int, int, int]
+
+# zlib level for PNG files: nearly the size of the default level at a fraction of the time
+PNG_COMPRESS_LEVEL = 1
+
+# Quality for lossy formats; UI text is still crisp at this setting
+LOSSY_QUALITY = 90
+
+# Encoder options by file extension. JPEG and WebP encode several times faster
+# than PNG, so PNG is only used when the caller asks for it by extension
+_SAVE_OPTIONS = {
+    ".png": {"compress_level": PNG_COMPRESS_LEVEL},
+    ".jpg": {"quality": LOSSY_QUALITY},
+    ".jpeg": {"quality": LOSSY_QUALITY},
+    ".webp": {"quality": LOSSY_QUALITY, "method": 4},
+}
+
+# Without Pillow, mss can only write PNG files
+DEFAULT_SCREENSHOT_EXT = ".jpg" if PIL_AVAILABLE else ".png"
+
+# mss handles are not thread-safe, and tools run on worker threads, so each
+# thread keeps its own grabber for the life of the process
+_local = threading.local()
+
+
+def _grabber():
+    """Return this thread's mss grabber, opening it on first use."""
+    sct = getattr(_local, "sct", None)
+    if sct is None:
+        sct = _local.sct = mss.mss()
+    return sct
+
+
+def grab(region: Optional[Region] = None):
+    """Grab the whole virtual screen, or just a region, as an mss ScreenShot."""
+    sct = _grabber()
+    if region is None:
+        monitor = sct.monitors[0]
+    else:
+        left, top, width, height = region
+        monitor = {"left": left, "top": top, "width": width, "height": height}
+    return sct.grab(monitor)
+
+
+def bgra_to_rgb(frame: "np.ndarray") -> "np.ndarray":
+    """Convert an (H, W, 4) BGRA frame to a contiguous (H, W, 3) RGB array."""
+    return np.ascontiguousarray(frame[:, :, 2::-1])
+
+
+def _shot_to_frame(shot) -> "np.ndarray":
+    """View an mss ScreenShot's raw BGRA buffer as an (H, W, 3) RGB array."""
+    return bgra_to_rgb(np.frombuffer(shot.raw, dtype=np.uint8).reshape(shot.height, shot.width, 4))
+
+
+def scaled_size(width: int, height: int, max_dim: Optional[int]) -> Optional[Tuple[int, int]]:
+    """Return the size that fits within max_dim, or None if no downscale is needed."""
+    longest = max(width, height)
+    if not max_dim or longest <= max_dim:
+        return None
+    scale = max_dim / longest
+    return max(1, round(width * scale)), max(1, round(height * scale))
+
+
+def downscale(frame: "np.ndarray", max_dim: Optional[int]) -> "np.ndarray":
+    """Shrink an (H, W, 3) frame so its longer side is at most max_dim.
+
+    Box (area-average) filtering keeps UI text legible at a fraction of the
+    pixels, which is what vision models see anyway.
+    """
+    size = scaled_size(frame.shape[1], frame.shape[0], max_dim)
+    if size is None:
+        return frame
+    if PIL_AVAILABLE:
+        return np.asarray(Image.fromarray(frame).resize(size, Image.BOX))
+
+    # Without PIL, average whole blocks: an area filter at an integer factor
+    factor = -(-max(frame.shape[:2]) // max_dim)
+    height = frame.shape[0] // factor * factor
+    width = frame.shape[1] // factor * factor
+    blocks = frame[:height, :width].reshape(height // factor, factor, width // factor, factor, 3)
+    return blocks.mean(axis=(1, 3)).astype(np.uint8)
+
+
+def grab_frame(region: Optional[Region] = None, max_dim: Optional[int] = None) -> "np.ndarray":
+    """Capture the screen (or a region) as an (H, W, 3) RGB uint8 array.
+
+    No image file is encoded and no PIL image is created: the raw mss
+    buffer is viewed as BGRA and reordered in one vectorized copy. With
+    max_dim, the frame is downscaled before it is returned.
+    """
+    if MSS_AVAILABLE:
+        frame = _shot_to_frame(grab(region))
+    else:
+        import pyautogui
+        frame = np.asarray(pyautogui.screenshot(region=region))
+    return downscale(frame, max_dim)
+
+
+def screenshot_filename(prefix: str = "screenshot") -> str:
+    """Return a timestamped filename in the default screenshot format."""
+    return f"{prefix}_{int(time.time())}{DEFAULT_SCREENSHOT_EXT}"
+
+
+def save_screenshot(filename: str, region: Optional[Region] = None,
+                    max_dim: Optional[int] = None) -> Tuple[int, int]:
+    """Capture the screen (or a region) to an image file and return its size.
+
+    The format follows the filename's extension (.jpg, .png, .webp, ...).
+    With max_dim, the capture is downscaled before it is encoded, so the
+    encoder only sees the pixels that will be kept.
+    """
+    ext = os.path.splitext(filename)[1].lower()
+    if not MSS_AVAILABLE:
+        import pyautogui
+        image = pyautogui.screenshot(region=region)
+    else:
+        shot = grab(region)
+        if not PIL_AVAILABLE:
+            if ext != ".png":
+                raise ValueError(f"Saving {ext or 'extensionless'} screenshots requires Pillow; use .png")
+            if scaled_size(shot.width, shot.height, max_dim) and NUMPY_AVAILABLE:
+                frame = downscale(_shot_to_frame(shot), max_dim)
+                size = (frame.shape[1], frame.shape[0])
+                mss.tools.to_png(frame.tobytes(), size, level=PNG_COMPRESS_LEVEL, output=filename)
+                return size
+            mss.tools.to_png(shot.rgb, shot.size, level=PNG_COMPRESS_LEVEL, output=filename)
+            return shot.width, shot.height
+        image = Image.frombytes("RGB", shot.size, shot.bgra, "raw", "BGRX")
+
+    size = scaled_size(image.width, image.height, max_dim)
+    if size is not None:
+        image = image.resize(size, Image.BOX)
+    image.save(filename, **_SAVE_OPTIONS.get(ext, {}))
+    return image.size
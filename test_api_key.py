@@ -2,13 +2,12 @@
 """Test script to diagnose API key issues"""
 
 import os
-from dotenv import load_dotenv
 
-# Load environment variables
-load_dotenv()
+# Importing config loads the .env file
+from config import API_KEY_PATTERN, get_api_key
 
-# Get API key
-api_key = os.getenv("GEMINI_API_KEY") or os.getenv("GOOGLE_API_KEY")
+# Get API key (already stripped of surrounding whitespace)
+api_key = get_api_key()
 
 print("=" * 60)
 print("API Key Diagnostic Test")
@@ -19,24 +18,24 @@ if not api_key:
     print("   Checked: GEMINI_API_KEY, GOOGLE_API_KEY")
     exit(1)
 
-# Clean the key
-api_key = api_key.strip()
-
 print(f"✓ API key found")
 print(f"  Length: {len(api_key)}")
 print(f"  Starts with 'AIza': {api_key.startswith('AIza')}")
 print(f"  First 20 chars: {api_key[:20]}...")
 print(f"  Last 10 chars: ...{api_key[-10:]}")
 
-# Check for common issues
+# Check for common issues; a well-formed key passes one regex scan, and the
+# individual checks only run to explain a key that doesn't
 issues = []
-if not api_key.startswith("AIza"):
-    issues.append("❌ Key doesn't start with 'AIza' - invalid format")
-if len(api_key) < 35 or len(api_key) > 45:
-    issues.append(f"⚠️  Key length ({len(api_key)}) seems unusual (expected ~39)")
-
-if " " in api_key:
-    issues.append("❌ Key contains spaces - check .env file formatting")
+if not API_KEY_PATTERN.fullmatch(api_key):
+    if not api_key.startswith("AIza"):
+        issues.append("❌ Key doesn't start with 'AIza' - invalid format")
+    if len(api_key) < 35 or len(api_key) > 45:
+        issues.append(f"⚠️  Key length ({len(api_key)}) seems unusual (expected ~39)")
+    if " " in api_key:
+        issues.append("❌ Key contains spaces - check .env file formatting")
+    if not issues:
+        issues.append("⚠️  Key doesn't match the usual format ('AIza' + 35 letters, digits, '-' or '_')")
 
 if issues:
     print("\n⚠️  Potential Issues:")
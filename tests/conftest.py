@@ -0,0 +1,97 @@
+"""
+Shared test setup. The modules under test live at the repository root, and
+memory tests use a deterministic stand-in for the embedding model.
+"""
+
+import sys
+import zlib
+from pathlib import Path
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import agent
+import config
+import response_cache
+
+
+def fake_embed_texts(texts):
+    """Embed each text as a unit vector picked by a hash of the text."""
+    vectors = np.zeros((len(texts), 16), dtype=np.float32)
+    for i, text in enumerate(texts):
+        vectors[i, zlib.crc32(text.encode('utf-8')) % 16] = 1.0
+    return vectors
+
+
+@pytest.fixture
+def fake_embeddings(monkeypatch):
+    """Give MemorySystem a vector index backed by fake_embed_texts; returns the call log."""
+    calls = []
+
+    def embed(texts):
+        calls.append(list(texts))
+        return fake_embed_texts(texts)
+
+    monkeypatch.setattr(agent, "EMBEDDINGS_AVAILABLE", True)
+    monkeypatch.setattr(agent, "embed_texts", embed)
+    return calls
+
+
+class StubModels:
+    """Stands in for client.models, answering every request with plain text."""
+
+    def __init__(self):
+        self.calls = 0
+
+    def generate_content(self, model, contents, config):
+        self.calls += 1
+        text = f"Stub answer {self.calls}"
+        part = SimpleNamespace(function_call=None, text=text, thought=None)
+        return SimpleNamespace(
+            text=text,
+            candidates=[SimpleNamespace(content=SimpleNamespace(parts=[part]))]
+        )
+
+    def get(self, model):
+        return SimpleNamespace(name=model)
+
+
+class StubClient:
+    """A Gemini client that counts generate_content calls and never goes online."""
+
+    def __init__(self):
+        self.models = StubModels()
+        self.caches = SimpleNamespace(create=lambda **kwargs: SimpleNamespace(name="cachedContents/stub"))
+
+
+@pytest.fixture
+def stub_client(tmp_path, monkeypatch):
+    """Point new agents at a StubClient, with their memory and cache files in tmp_path."""
+    client = StubClient()
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setenv("GEMINI_API_KEY", "AIza" + "x" * 35)
+    monkeypatch.setenv("GOOGLE_API_KEY", "AIza" + "x" * 35)
+    monkeypatch.setattr(agent, "_get_client", lambda api_key: client)
+    # Exact-match lookups are all these tests need; skip loading an embedding model
+    monkeypatch.setattr(agent, "EMBEDDINGS_AVAILABLE", False)
+    monkeypatch.setattr(response_cache, "EMBEDDINGS_AVAILABLE", False)
+    # Agents write memory and cache files relative to tmp_path; flush them
+    # before the working directory is restored rather than at exit
+    created = []
+    original_init = agent.PyMOLAgent.__init__
+
+    def recording_init(self, *args, **kwargs):
+        original_init(self, *args, **kwargs)
+        created.append(self)
+
+    monkeypatch.setattr(agent.PyMOLAgent, "__init__", recording_init)
+    config.get_api_key.cache_clear()
+    yield client
+    config.get_api_key.cache_clear()
+    for instance in created:
+        instance.memory.flush()
+        if instance.response_cache is not None:
+            instance.response_cache.flush()
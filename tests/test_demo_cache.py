@@ -0,0 +1,29 @@
+"""
+Checks that a rerun of the basic demo is answered from the response cache.
+"""
+
+import asyncio
+
+import main
+
+
+def test_demo_rerun_skips_gemini(stub_client, monkeypatch):
+    # Record each agent the demo creates, to flush its cache the way exiting would
+    created = []
+
+    class RecordingAgent(main.IntegratedPyMOLAgent):
+        def __init__(self, *args, **kwargs):
+            super().__init__(*args, **kwargs)
+            created.append(self)
+
+    monkeypatch.setattr(main, "IntegratedPyMOLAgent", RecordingAgent)
+
+    first = asyncio.run(main.demo_basic_functionality())
+    first_calls = stub_client.models.calls
+    created[-1].agent.response_cache.flush()
+
+    second = asyncio.run(main.demo_basic_functionality())
+
+    assert first_calls == len(first)
+    assert stub_client.models.calls == first_calls
+    assert second == first
@@ -0,0 +1,182 @@
+"""
+Tests for MemorySystem's append-only JSON lines log: reloading, folding
+embedding update rows into their memories, and the one-time rewrite.
+"""
+
+import json
+
+import agent
+from agent import MemorySystem
+from embeddings import quantize_vectors
+
+
+def read_rows(path):
+    return [json.loads(line) for line in path.read_bytes().splitlines() if line.strip()]
+
+
+def test_long_term_memories_reload_in_order(tmp_path):
+    path = tmp_path / "memory.jsonl"
+    memory = MemorySystem(memory_file=str(path))
+    for i in range(3):
+        memory.add_long_term(f"fact {i}", importance=0.5 + i / 10, tags=[f"t{i}"])
+    memory.flush()
+
+    reloaded = MemorySystem(memory_file=str(path))
+
+    assert [mem.content for mem in reloaded.long_term] == ["fact 0", "fact 1", "fact 2"]
+    assert [mem.tags for mem in reloaded.long_term] == [["t0"], ["t1"], ["t2"]]
+    assert reloaded.long_term[2].importance == 0.7
+
+
+def test_memories_are_written_before_they_are_embedded(tmp_path, fake_embeddings):
+    path = tmp_path / "memory.jsonl"
+    memory = MemorySystem(memory_file=str(path))
+    memory.add_long_term("load 1ubq as cartoon")
+    memory._writer.flush()
+
+    # The record is on disk before its batch has been embedded
+    assert not fake_embeddings
+    assert [row["content"] for row in read_rows(path)] == ["load 1ubq as cartoon"]
+    assert "embedding" not in read_rows(path)[0]
+
+    memory.flush()
+
+    rows = read_rows(path)
+    assert len(rows) == 2
+    assert "embedding_for" in rows[1] and rows[1]["embedding"]
+
+
+def test_update_rows_fold_into_their_memories(tmp_path, fake_embeddings):
+    path = tmp_path / "memory.jsonl"
+    memory = MemorySystem(memory_file=str(path))
+    for text in ["first memory", "second memory", "third memory"]:
+        memory.add_long_term(text)
+    memory.flush()
+    expected = {mem.content: memory.vector_index.get_vector(mem).tolist()
+                for mem in memory.long_term}
+    fake_embeddings.clear()
+
+    reloaded = MemorySystem(memory_file=str(path))
+
+    # Stored vectors are reused rather than embedded again
+    assert not fake_embeddings
+    assert {mem.content: reloaded.vector_index.get_vector(mem).tolist()
+            for mem in reloaded.long_term} == expected
+
+
+def test_load_rewrites_the_log_without_update_rows(tmp_path, fake_embeddings):
+    path = tmp_path / "memory.jsonl"
+    memory = MemorySystem(memory_file=str(path))
+    memory.add_long_term("alpha")
+    memory.add_long_term("beta")
+    memory.flush()
+    assert any("embedding_for" in row for row in read_rows(path))
+
+    MemorySystem(memory_file=str(path))
+
+    rows = read_rows(path)
+    assert [row["content"] for row in rows] == ["alpha", "beta"]
+    assert all("embedding_for" not in row and row["embedding"] for row in rows)
+
+
+def test_legacy_json_array_is_migrated(tmp_path):
+    legacy = tmp_path / "memory.json"
+    legacy.write_text(json.dumps([{
+        "timestamp": "2024-01-02T03:04:05",
+        "content": "old memory",
+        "importance": 0.9,
+        "tags": []
+    }]))
+
+    memory = MemorySystem(memory_file=str(tmp_path / "memory.jsonl"))
+
+    assert [mem.content for mem in memory.long_term] == ["old memory"]
+    assert [row["content"] for row in read_rows(tmp_path / "memory.jsonl")] == ["old memory"]
+
+
+def test_torn_last_line_is_dropped_and_the_log_repaired(tmp_path):
+    path = tmp_path / "memory.jsonl"
+    memory = MemorySystem(memory_file=str(path))
+    for i in range(21):
+        memory.add_long_term(f"fact {i}")
+    memory.flush()
+    # A crash in the middle of an append leaves an unterminated record
+    with open(path, 'ab') as f:
+        f.write(b'{"timestamp": "2024-01-02T03:04:05", "content": "torn')
+
+    reloaded = MemorySystem(memory_file=str(path))
+    assert len(reloaded.long_term) == 21
+    assert path.read_bytes().endswith(b"\n")
+
+    reloaded.add_long_term("written after the crash")
+    reloaded.flush()
+
+    contents = [mem.content for mem in MemorySystem(memory_file=str(path)).long_term]
+    assert len(contents) == 22
+    assert contents[-1] == "written after the crash"
+
+
+def test_malformed_record_is_skipped(tmp_path):
+    path = tmp_path / "memory.jsonl"
+    memory = MemorySystem(memory_file=str(path))
+    memory.add_long_term("kept before")
+    memory.flush()
+    with open(path, 'ab') as f:
+        f.write(b'{"content": "no timestamp"}\n')
+    memory.add_long_term("kept after")
+    memory.flush()
+
+    reloaded = MemorySystem(memory_file=str(path))
+
+    assert [mem.content for mem in reloaded.long_term] == ["kept before", "kept after"]
+    assert [row["content"] for row in read_rows(path)] == ["kept before", "kept after"]
+
+
+def expected_vector(text):
+    """The stored form of the (fake) embedding of text."""
+    return quantize_vectors(agent.embed_texts([text]))[0].tolist()
+
+
+def test_update_rows_name_memories_by_id(tmp_path, fake_embeddings):
+    path = tmp_path / "memory.jsonl"
+    memory = MemorySystem(memory_file=str(path))
+    memory.add_long_term("alpha")
+    memory.flush()
+
+    record, update = read_rows(path)
+    assert record["id"] == memory.long_term[0].memory_id
+    assert update["embedding_for"] == record["id"]
+
+
+def test_vectors_reach_the_right_memories_with_two_writers(tmp_path, fake_embeddings):
+    path = tmp_path / "memory.jsonl"
+    path.write_bytes(b"")
+    first = MemorySystem(memory_file=str(path))
+    second = MemorySystem(memory_file=str(path))
+    first.add_long_term("written by the first")
+    second.add_long_term("written by the second")
+    first.add_long_term("first again")
+    first.flush()
+    second.flush()
+
+    reloaded = MemorySystem(memory_file=str(path))
+
+    assert len(reloaded.long_term) == 3
+    for mem in reloaded.long_term:
+        assert reloaded.vector_index.get_vector(mem).tolist() == expected_vector(mem.content)
+
+
+def test_positional_update_rows_from_older_logs_are_re_embedded(tmp_path, fake_embeddings):
+    path = tmp_path / "memory.jsonl"
+    path.write_text(
+        json.dumps({"timestamp": "2024-01-02T03:04:05", "content": "alpha",
+                    "importance": 1.0, "tags": []}) + "\n"
+        + json.dumps({"embedding_for": 0, "embedding": "AAAA", "model": "old"}) + "\n"
+    )
+
+    memory = MemorySystem(memory_file=str(path))
+
+    mem, = memory.long_term
+    assert memory.vector_index.get_vector(mem).tolist() == expected_vector("alpha")
+    rows = read_rows(path)
+    assert len(rows) == 1 and rows[0]["id"] == mem.memory_id
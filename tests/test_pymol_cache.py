@@ -0,0 +1,116 @@
+"""
+Tests for PyMOLCommandExecutor's query cache: TTL expiry, invalidation by
+commands that may change the session, and separate keys for API queries.
+"""
+
+from types import SimpleNamespace
+
+import pytest
+
+import pymol_tools
+from pymol_tools import PyMOLCommandExecutor
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """Replace the cache's clock with one the test advances by hand."""
+    now = [1000.0]
+    monkeypatch.setattr(pymol_tools, "time", SimpleNamespace(monotonic=lambda: now[0]))
+    return now
+
+
+def counting(result):
+    """Return a run() callback that records how often it ran."""
+    def run():
+        run.calls += 1
+        return dict(result)
+    run.calls = 0
+    return run
+
+
+def test_read_only_results_are_reused(clock):
+    executor = PyMOLCommandExecutor()
+    run = counting({"success": True, "output": "42"})
+
+    first = executor._cached("count_atoms all", run)
+    second = executor._cached("count_atoms all", run)
+
+    assert run.calls == 1
+    assert "cached" not in first
+    assert second["cached"] is True and second["output"] == "42"
+
+
+def test_results_expire_after_the_ttl(clock):
+    executor = PyMOLCommandExecutor()
+    run = counting({"success": True, "output": "42"})
+
+    executor._cached("count_atoms all", run)
+    clock[0] += pymol_tools.QUERY_CACHE_TTL + 1
+    executor._cached("count_atoms all", run)
+
+    assert run.calls == 2
+
+
+def test_commands_that_change_the_session_invalidate(clock):
+    executor = PyMOLCommandExecutor()
+    query = counting({"success": True, "output": "42"})
+
+    executor._cached("count_atoms all", query)
+    executor._cached("remove resn HOH", counting({"success": True}))
+    executor._cached("count_atoms all", query)
+
+    assert query.calls == 2
+    assert executor._generation == 1
+
+
+def test_failures_are_not_cached(clock):
+    executor = PyMOLCommandExecutor()
+    run = counting({"success": False, "error": "no such selection"})
+
+    executor._cached("count_atoms missing", run)
+    executor._cached("count_atoms missing", run)
+
+    assert run.calls == 2
+
+
+def test_object_list_query_has_its_own_key(clock, monkeypatch):
+    executor = PyMOLCommandExecutor()
+    executor.session_active = True
+    monkeypatch.setattr(executor, "_execute_in_session",
+                        lambda command: {"success": True, "output": "['1ubq']\n"})
+    monkeypatch.setattr(executor, "_list_session_objects",
+                        lambda: {"success": True, "objects": ["1ubq"]})
+
+    printed = executor.execute_command("get_object_list")
+    listed = executor.get_object_list()
+
+    assert "objects" not in printed
+    assert listed["objects"] == ["1ubq"]
+
+
+def test_cached_results_are_copies(clock):
+    executor = PyMOLCommandExecutor()
+    run = counting({"success": True, "center_of_mass": [1.0, 2.0, 3.0]})
+    miss = executor._cached("get_selection_info all", run)
+    miss["center_of_mass"].append(98.0)
+
+    hit = executor._cached("get_selection_info all", run)
+    hit["center_of_mass"].append(99.0)
+
+    assert executor._cached("get_selection_info all", run)["center_of_mass"] == [1.0, 2.0, 3.0]
+
+
+def test_selection_query_has_its_own_key(clock, monkeypatch):
+    executor = PyMOLCommandExecutor()
+    executor.session_active = True
+    monkeypatch.setattr(pymol_tools, "NUMPY_AVAILABLE", True)
+    monkeypatch.setattr(executor, "_execute_in_session",
+                        lambda command: {"success": True, "output": "printed\n"})
+    monkeypatch.setattr(executor, "_measure_selection",
+                        lambda selection: {"success": True, "atom_count": 12})
+
+    printed = executor.execute_command("get_selection_info all")
+    measured = executor.get_selection_info("all")
+
+    assert "atom_count" not in printed
+    assert measured["atom_count"] == 12
@@ -0,0 +1,92 @@
+"""
+Tests for ResponseCache scoping and the agent's stateless requests.
+"""
+
+import asyncio
+
+from agent import PyMOLAgent
+from response_cache import ResponseCache
+
+
+def test_hits_are_confined_to_their_scope(tmp_path, monkeypatch):
+    monkeypatch.setattr("response_cache.EMBEDDINGS_AVAILABLE", False)
+    cache = ResponseCache(str(tmp_path / "cache.jsonl"))
+    cache.put("scope-a", "what is PyMOL?", "A molecular viewer.")
+
+    assert cache.get("scope-a", "what is PyMOL?") == "A molecular viewer."
+    assert cache.get("scope-b", "what is PyMOL?") is None
+    assert cache.get("scope-a", "what is pymol") is None
+
+
+def test_entries_survive_a_reload(tmp_path, monkeypatch):
+    monkeypatch.setattr("response_cache.EMBEDDINGS_AVAILABLE", False)
+    path = tmp_path / "cache.jsonl"
+    cache = ResponseCache(str(path))
+    cache.put("scope", "hello", "hi there")
+    cache.flush()
+
+    assert ResponseCache(str(path)).get("scope", "hello") == "hi there"
+
+
+def test_scope_follows_the_conversation(stub_client):
+    agent = PyMOLAgent(cache_responses=False)
+    before = agent._cache_scope(0.1)
+
+    agent.memory.add_short_term("User: load 1ubq")
+
+    assert agent._cache_scope(0.1) != before
+    assert agent._cache_scope(0.2) != agent._cache_scope(0.1)
+
+
+def test_stateless_scope_ignores_the_conversation(stub_client):
+    agent = PyMOLAgent(cache_responses=False)
+    before = agent._cache_scope(0.1, stateless=True)
+
+    agent.memory.add_short_term("User: load 1ubq")
+
+    assert agent._cache_scope(0.1, stateless=True) == before
+
+
+def test_stateless_message_is_answered_from_cache_after_other_turns(stub_client):
+    agent = PyMOLAgent()
+
+    async def conversation():
+        first = await agent.process_message("What is PyMOL?", stateless=True)
+        await agent.process_message("Tell me about ribbons")
+        second = await agent.process_message("What is PyMOL?", stateless=True)
+        return first, second
+
+    first, second = asyncio.run(conversation())
+
+    assert first == second
+    assert stub_client.models.calls == 2
+
+
+def test_repeated_message_misses_once_the_conversation_moves_on(stub_client):
+    agent = PyMOLAgent()
+
+    async def conversation():
+        await agent.process_message("What is PyMOL?")
+        await agent.process_message("What is PyMOL?")
+
+    asyncio.run(conversation())
+
+    assert stub_client.models.calls == 2
+
+
+def test_torn_last_line_does_not_lose_the_cache(tmp_path, monkeypatch):
+    monkeypatch.setattr("response_cache.EMBEDDINGS_AVAILABLE", False)
+    path = tmp_path / "cache.jsonl"
+    cache = ResponseCache(str(path))
+    cache.put("scope", "hello", "hi there")
+    cache.flush()
+    with open(path, 'ab') as f:
+        f.write(b'{"scope": "scope", "message": "torn')
+
+    reloaded = ResponseCache(str(path))
+    reloaded.put("scope", "bye", "goodbye")
+    reloaded.flush()
+
+    again = ResponseCache(str(path))
+    assert again.get("scope", "hello") == "hi there"
+    assert again.get("scope", "bye") == "goodbye"
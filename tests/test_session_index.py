@@ -0,0 +1,53 @@
+"""
+Tests for SessionIndex, the per-session centroids used to route semantic search.
+"""
+
+import numpy as np
+
+from agent import MemorySystem
+from embeddings import SessionIndex
+
+
+def unit(i, size=4):
+    vector = np.zeros(size, dtype=np.float32)
+    vector[i] = 1.0
+    return vector
+
+
+def test_discarded_rows_leave_the_centroid():
+    index = SessionIndex()
+    index.add("a", 0, unit(0))
+    index.add("a", 1, unit(1))
+    index.add("b", 2, unit(2))
+
+    index.discard("a", 0, unit(0))
+
+    assert index.rows["a"] == [1]
+    # Session a now points along axis 1 only, so a query there routes to it
+    assert index.candidate_rows(unit(1), 1).tolist() == [1]
+    assert index.candidate_rows(unit(0), 2).tolist() in ([1, 2], [2, 1])
+
+
+def test_empty_sessions_are_dropped():
+    index = SessionIndex()
+    index.add("a", 0, unit(0))
+    index.add("b", 1, unit(1))
+
+    index.discard("a", 0, unit(0))
+
+    assert len(index) == 1
+    assert index.candidate_rows(unit(0), 5).tolist() == [1]
+
+
+def test_evicted_short_term_memories_leave_their_session(tmp_path, fake_embeddings):
+    memory = MemorySystem(max_short_term=2, memory_file=str(tmp_path / "memory.jsonl"))
+    for i in range(3):
+        memory.add_short_term(f"passing remark {i}", importance=0.1)
+    memory.flush()
+    memory.add_short_term("one more", importance=0.1)
+    memory.flush()
+
+    live_rows = sorted(mem.row for mem in memory.short_term)
+    assert sorted(memory.session_index.rows[memory.session_id]) == live_rows
+    expected = sum(memory.vector_index.vectors[row].astype(np.float32) for row in live_rows)
+    assert memory.session_index._sums[memory.session_id].tolist() == expected.tolist()
@@ -4,24 +4,80 @@ This module provides vision analysis capabilities for molecular visualization.
 """
 
 import base64
+import copy
+import functools
 import io
-from typing import Dict, Any, List, Optional
+import os
+import threading
+from typing import Callable, Dict, Any, List, Optional, Tuple
 from pathlib import Path
-import json
+
+from screen_capture import PNG_COMPRESS_LEVEL
 
 try:
     from PIL import Image
-    from PIL import ImageDraw, ImageFont
+    from PIL import ImageChops, ImageDraw, ImageFont
     PIL_AVAILABLE = True
 except ImportError:
     PIL_AVAILABLE = False
 
+try:
+    import numpy as np
+    NUMPY_AVAILABLE = True
+except ImportError:
+    NUMPY_AVAILABLE = False
+
+
+# Encoder options for annotated images, by source format. Other formats use
+# Pillow's defaults
+_ANNOTATED_SAVE_OPTIONS = {
+    "PNG": {"compress_level": PNG_COMPRESS_LEVEL},
+}
+
+# Images are compared at this size unless both are already this small and match
+COMPARE_SIZE = (256, 256)
+
+
+def _comparison_thumbnail(img):
+    """Return img as a COMPARE_SIZE RGB image, ignoring its aspect ratio."""
+    # JPEGs can decode straight to a reduced scale, skipping most of the decode
+    img.draft('RGB', COMPARE_SIZE)
+    if img.mode != 'RGB':
+        img = img.convert('RGB')
+    return img.resize(COMPARE_SIZE, Image.BOX, reducing_gap=2.0)
+
+
+# Edge detection measures about this many neighboring-pixel pairs, sampled
+# along evenly spaced rows and columns, however large the image is
+EDGE_SAMPLE_PAIRS = 100_000
+
+
+def _edge_stride(width: int, height: int) -> int:
+    """Return the row/column stride that keeps edge detection near EDGE_SAMPLE_PAIRS."""
+    return max(1, 2 * width * height // EDGE_SAMPLE_PAIRS)
+
+
+def _horizontal_jumps(lines) -> Tuple[int, int]:
+    """Count intensity jumps above 30 between horizontal neighbors in a grayscale PIL image.
+    
+    Returns (jumps, neighbor pairs compared).
+    """
+    width, height = lines.size
+    diff = ImageChops.difference(lines.crop((1, 0, width, height)),
+                                 lines.crop((0, 0, width - 1, height)))
+    return sum(diff.histogram()[31:]), (width - 1) * height
+
+
+@functools.lru_cache(maxsize=None)
+def _default_font():
+    """Load Pillow's default font once; loading it can mean reading a font file."""
+    return ImageFont.load_default()
+
 
 class VisionAnalyzer:
     """Analyzes molecular images and provides visual insights."""
     
-    def __init__(self):
-        self.supported_formats = ['.png', '.jpg', '.jpeg', '.gif', '.bmp']
+    supported_formats = frozenset({'.png', '.jpg', '.jpeg', '.gif', '.bmp'})
     
     def analyze_image(self, image_path: str) -> Dict[str, Any]:
         """Analyze a molecular image and extract features."""
@@ -45,11 +101,21 @@ class VisionAnalyzer:
                 format_info = img.format
                 mode = img.mode
                 
+                # Decode and convert once; both analyses read from these
+                if NUMPY_AVAILABLE and mode == 'RGBA':
+                    # Drop alpha on a view rather than allocating an RGB copy
+                    rgb = np.asarray(img)[..., :3]
+                else:
+                    rgb = img if mode == 'RGB' else img.convert('RGB')
+                gray = img if mode == 'L' else img.convert('L')
+                if NUMPY_AVAILABLE:
+                    rgb, gray = np.asarray(rgb), np.asarray(gray)
+                
                 # Color analysis
-                colors = self._analyze_colors(img)
+                colors = self._analyze_colors(rgb)
                 
                 # Detect potential molecular features
-                features = self._detect_molecular_features(img)
+                features = self._detect_molecular_features(gray)
                 
                 return {
                     "success": True,
@@ -70,25 +136,22 @@ class VisionAnalyzer:
                 "error": f"Error analyzing image: {str(e)}"
             }
     
-    def _analyze_colors(self, img) -> Dict[str, Any]:
-        """Analyze color distribution in the image."""
+    def _analyze_colors(self, rgb) -> Dict[str, Any]:
+        """Analyze color distribution in an RGB image (an (H, W, 3) array with numpy)."""
         try:
-            # Convert to RGB if necessary
-            if img.mode != 'RGB':
-                img = img.convert('RGB')
-            
-            # Get color histogram
-            colors = img.getcolors(maxcolors=256*256*256)
-            
-            if colors:
+            # Get color histogram and the most frequent colors
+            if NUMPY_AVAILABLE:
+                total_colors, top_colors = self._top_colors(rgb, 10)
+            else:
+                colors = rgb.getcolors(maxcolors=256*256*256) or []
+                
                 # Sort by frequency
                 colors.sort(key=lambda x: x[0], reverse=True)
-                
-                # Get top colors
-                top_colors = [(count, rgb) for count, rgb in colors[:10]]
-                
+                total_colors, top_colors = len(colors), colors[:10]
+            
+            if total_colors:
                 return {
-                    "total_unique_colors": len(colors),
+                    "total_unique_colors": total_colors,
                     "dominant_colors": top_colors,
                     "analysis": "Color distribution calculated successfully"
                 }
@@ -98,8 +161,26 @@ class VisionAnalyzer:
         except Exception as e:
             return {"error": f"Color analysis failed: {str(e)}"}
     
-    def _detect_molecular_features(self, img) -> Dict[str, Any]:
-        """Detect potential molecular visualization features."""
+    @staticmethod
+    def _top_colors(rgb, k: int) -> Tuple[int, List[tuple]]:
+        """Count the distinct colors in an RGB image or array and return the k most frequent.
+        
+        Returns the number of distinct colors and a list of (count, (r, g, b))
+        in descending order of count. Each pixel is packed into one 24-bit
+        integer so the colors are counted with a single np.unique, and only the
+        top k are partitioned out and sorted.
+        """
+        rgb = np.asarray(rgb, dtype=np.uint32)
+        keys = (rgb[..., 0] << 16) | (rgb[..., 1] << 8) | rgb[..., 2]
+        unique, counts = np.unique(keys, return_counts=True)
+        
+        top = np.argpartition(counts, -k)[-k:] if unique.size > k else np.arange(unique.size)
+        top = top[np.argsort(-counts[top], kind='stable')]
+        return unique.size, [(count, (key >> 16, (key >> 8) & 0xFF, key & 0xFF))
+                             for key, count in zip(unique[top].tolist(), counts[top].tolist())]
+    
+    def _detect_molecular_features(self, gray) -> Dict[str, Any]:
+        """Detect potential molecular visualization features in a grayscale image (a 2-D array with numpy)."""
         features = {
             "spheres_detected": False,
             "sticks_detected": False,
@@ -113,18 +194,39 @@ class VisionAnalyzer:
             # Simple heuristic-based feature detection
             # This is a basic implementation - could be enhanced with ML models
             
-            width, height = img.size
-            pixels = list(img.getdata())
-            
-            # Convert to grayscale for analysis
-            if img.mode != 'L':
-                img_gray = img.convert('L')
-                pixels = list(img_gray.getdata())
-            
-            # Edge detection heuristic
-            edge_pixels = sum(1 for i in range(1, len(pixels)) 
-                            if abs(pixels[i] - pixels[i-1]) > 30)
-            edge_ratio = edge_pixels / len(pixels)
+            # Edge detection heuristic: intensity jumps between horizontally
+            # and vertically adjacent pixels, measured along every stride-th
+            # row and column so large images cost no more than small ones
+            if NUMPY_AVAILABLE:
+                height, width = gray.shape
+                stride = _edge_stride(width, height)
+                rows = gray[::stride]
+                columns = gray[:, ::stride]
+                # Subtract straight into int16 so the differences can't wrap
+                # around, then take the absolute value in place
+                dx = np.subtract(rows[:, 1:], rows[:, :-1], dtype=np.int16)
+                dy = np.subtract(columns[1:], columns[:-1], dtype=np.int16)
+                np.abs(dx, out=dx)
+                np.abs(dy, out=dy)
+                edge_pixels = int(np.count_nonzero(dx > 30) + np.count_nonzero(dy > 30))
+                pairs = dx.size + dy.size
+            else:
+                width, height = gray.size
+                stride = _edge_stride(width, height)
+                data = gray.tobytes()
+                # Sampled rows, and sampled columns laid out as rows, so Pillow
+                # can diff both against their neighbor one pixel over in C
+                rows = range(0, height, stride)
+                columns = range(0, width, stride)
+                row_lines = Image.frombytes('L', (width, len(rows)), b''.join(
+                    data[y * width:(y + 1) * width] for y in rows))
+                column_lines = Image.frombytes('L', (height, len(columns)), b''.join(
+                    data[x::width] for x in columns))
+                row_jumps, row_pairs = _horizontal_jumps(row_lines)
+                column_jumps, column_pairs = _horizontal_jumps(column_lines)
+                edge_pixels = row_jumps + column_jumps
+                pairs = row_pairs + column_pairs
+            edge_ratio = edge_pixels / pairs if pairs else 0.0
             
             # Feature heuristics (simplified)
             if edge_ratio > 0.15:
@@ -156,6 +258,7 @@ class VisionAnalyzer:
         try:
             with Image.open(image_path) as img:
                 draw = ImageDraw.Draw(img)
+                font = _default_font()
                 
                 for annotation in annotations:
                     x = annotation.get('x', 0)
@@ -164,11 +267,13 @@ class VisionAnalyzer:
                     color = annotation.get('color', 'red')
                     
                     # Draw text annotation
-                    draw.text((x, y), text, fill=color)
+                    draw.text((x, y), text, fill=color, font=font)
                 
-                # Save annotated image
-                output_path = Path(image_path).stem + "_annotated" + Path(image_path).suffix
-                img.save(output_path)
+                # Save annotated image in the source's own format
+                source = Path(image_path)
+                output_path = source.stem + "_annotated" + source.suffix
+                img.save(output_path, format=img.format,
+                         **_ANNOTATED_SAVE_OPTIONS.get(img.format, {}))
                 
                 return {
                     "success": True,
@@ -192,34 +297,41 @@ class VisionAnalyzer:
         
         try:
             with Image.open(image1_path) as img1, Image.open(image2_path) as img2:
-                # Basic comparison
+                # Basic comparison, from the headers Image.open has read
                 size_same = img1.size == img2.size
                 format_same = img1.mode == img2.mode
+                image1_info = {"size": img1.size, "mode": img1.mode}
+                image2_info = {"size": img2.size, "mode": img2.mode}
                 
-                # Simple pixel difference calculation
-                if size_same and img1.mode == img2.mode:
+                # Same-size images no bigger than a thumbnail are compared pixel
+                # for pixel. Anything else is compared as COMPARE_SIZE thumbnails,
+                # which bounds the cost and lets renders of different sizes
+                # (or modes) be compared at all
+                if size_same and img1.width * img1.height <= COMPARE_SIZE[0] * COMPARE_SIZE[1]:
                     if img1.mode != 'RGB':
                         img1 = img1.convert('RGB')
+                    if img2.mode != 'RGB':
                         img2 = img2.convert('RGB')
-                    
-                    # Calculate differences
-                    pixels1 = list(img1.getdata())
-                    pixels2 = list(img2.getdata())
-                    
-                    total_diff = sum(abs(p1[i] - p2[i]) for p1, p2 in zip(pixels1, pixels2) for i in range(3))
-                    avg_diff = total_diff / (len(pixels1) * 3)
-                    
-                    similarity = max(0, 100 - (avg_diff / 255 * 100))
                 else:
-                    similarity = "Cannot calculate - different sizes or formats"
+                    img1 = _comparison_thumbnail(img1)
+                    img2 = _comparison_thumbnail(img2)
+                
+                # Calculate differences (mean absolute difference per channel).
+                # Pillow diffs the images in C; the histogram holds 256 bins
+                # per channel, indexed by difference value
+                histogram = ImageChops.difference(img1, img2).histogram()
+                total_diff = sum((value & 0xFF) * count for value, count in enumerate(histogram))
+                avg_diff = total_diff / (img1.width * img1.height * 3)
+                
+                similarity = max(0, 100 - (avg_diff / 255 * 100))
                 
                 return {
                     "success": True,
                     "size_same": size_same,
                     "format_same": format_same,
                     "similarity_percentage": similarity,
-                    "image1_info": {"size": img1.size, "mode": img1.mode},
-                    "image2_info": {"size": img2.size, "mode": img2.mode}
+                    "image1_info": image1_info,
+                    "image2_info": image2_info
                 }
                 
         except Exception as e:
@@ -229,6 +341,62 @@ class VisionAnalyzer:
             }
 
 
+# VisionAnalyzer holds no per-image state, so every tool call shares one instance
+_analyzer = VisionAnalyzer()
+
+# Results kept for this many distinct image files, per tool
+IMAGE_CACHE_SIZE = 64
+
+# Successful results by (path, modification time, size); dicts keep insertion
+# order, so the first key is the least recently used entry
+_analysis_cache: Dict[tuple, dict] = {}
+_info_cache: Dict[tuple, dict] = {}
+_image_cache_lock = threading.Lock()
+
+
+def _cached_result(cache: Dict[tuple, dict], image_path: str, stat: os.stat_result,
+                   compute: Callable[[], dict]) -> dict:
+    """Return compute()'s result for an image, reused until the file changes.
+    
+    Failures are not cached, and every caller gets its own deep copy, so a
+    caller that edits its result can't change what later calls see.
+    """
+    key = (image_path, stat.st_mtime_ns, stat.st_size)
+    with _image_cache_lock:
+        result = cache.pop(key, None)
+        if result is not None:
+            cache[key] = result
+    
+    if result is None:
+        result = compute()
+        if not result.get("success"):
+            return result
+        with _image_cache_lock:
+            cache[key] = result
+            if len(cache) > IMAGE_CACHE_SIZE:
+                del cache[next(iter(cache))]
+    return copy.deepcopy(result)
+
+
+def _read_image_info(image_path: str, file_size: int) -> dict:
+    """Read an image header."""
+    try:
+        # Image.open only reads the header, which is all this needs
+        with Image.open(image_path) as img:
+            return {
+                "success": True,
+                "size": img.size,
+                "format": img.format,
+                "mode": img.mode,
+                "file_size": file_size
+            }
+    except Exception as e:
+        return {
+            "success": False,
+            "error": f"Error reading image: {str(e)}"
+        }
+
+
 # Vision tool functions for the agent
 def analyze_molecular_image(image_path: str) -> dict:
     """Analyze a molecular image and extract visual features.
@@ -239,8 +407,14 @@ def analyze_molecular_image(image_path: str) -> dict:
     Returns:
         Dictionary containing image analysis results
     """
-    analyzer = VisionAnalyzer()
-    return analyzer.analyze_image(image_path)
+    # Agents often ask about the same render again; unless the file has
+    # changed since, the earlier result is returned without decoding it again
+    try:
+        stat = os.stat(image_path)
+    except OSError:
+        return _analyzer.analyze_image(image_path)
+    return _cached_result(_analysis_cache, image_path, stat,
+                          lambda: _analyzer.analyze_image(image_path))
 
 
 def annotate_molecular_image(image_path: str, annotations: list) -> dict:
@@ -253,8 +427,7 @@ def annotate_molecular_image(image_path: str, annotations: list) -> dict:
     Returns:
         Dictionary containing annotation results
     """
-    analyzer = VisionAnalyzer()
-    return analyzer.annotate_image(image_path, annotations)
+    return _analyzer.annotate_image(image_path, annotations)
 
 
 def compare_molecular_images(image1_path: str, image2_path: str) -> dict:
@@ -267,8 +440,7 @@ def compare_molecular_images(image1_path: str, image2_path: str) -> dict:
     Returns:
         Dictionary containing comparison results
     """
-    analyzer = VisionAnalyzer()
-    return analyzer.compare_images(image1_path, image2_path)
+    return _analyzer.compare_images(image1_path, image2_path)
 
 
 def get_image_info(image_path: str) -> dict:
@@ -287,19 +459,16 @@ def get_image_info(image_path: str) -> dict:
         }
     
     try:
-        with Image.open(image_path) as img:
-            return {
-                "success": True,
-                "size": img.size,
-                "format": img.format,
-                "mode": img.mode,
-                "file_size": Path(image_path).stat().st_size if Path(image_path).exists() else 0
-            }
+        # One stat call, which also keys the cache; a missing file raises
+        # here just as Image.open would
+        stat = os.stat(image_path)
     except Exception as e:
         return {
             "success": False,
             "error": f"Error reading image: {str(e)}"
         }
+    return _cached_result(_info_cache, image_path, stat,
+                          lambda: _read_image_info(image_path, stat.st_size))
 
 
 # Utility function to register all vision tools with the agent
@@ -0,0 +1,139 @@
+"""
+Phase 2: Tool Development - Window Lookup
+This module caches desktop window enumeration for the window-based tools.
+
+pygetwindow is imported by the functions that need it, which are only
+reached once the calling tool has loaded its automation libraries.
+"""
+
+import sys
+import threading
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+if sys.platform == "win32":
+    import ctypes
+    from ctypes import wintypes
+    # A private handle, so setting restypes can't affect other users of windll.user32
+    _user32 = ctypes.WinDLL("user32")
+    _user32.GetForegroundWindow.restype = wintypes.HWND
+    _WNDENUMPROC = ctypes.WINFUNCTYPE(wintypes.BOOL, wintypes.HWND, wintypes.LPARAM)
+
+
+# Enumerating every top-level window is a heavy native call, so a listing is
+# reused for this many seconds before the desktop is enumerated again
+WINDOW_CACHE_TTL = 0.25
+
+_lock = threading.Lock()
+_cache: Dict[str, Any] = {"ts": float("-inf"), "entries": [], "matches": {}}
+
+
+def _enum_windows_native() -> List[Tuple[Any, str, int]]:
+    """List visible top-level windows and their titles with direct Win32 calls.
+
+    Each title is read once here, instead of through a native call on every
+    `.title` access of a pygetwindow window.
+    """
+    import pygetwindow as gw
+
+    hwnds = []
+    _user32.EnumWindows(_WNDENUMPROC(lambda hwnd, _: hwnds.append(hwnd) or True), 0)
+
+    entries = []
+    buffer = ctypes.create_unicode_buffer(256)
+    for hwnd in hwnds:
+        if not _user32.IsWindowVisible(hwnd):
+            continue
+        length = _user32.GetWindowTextLengthW(hwnd)
+        if length >= len(buffer):
+            buffer = ctypes.create_unicode_buffer(length + 1)
+        _user32.GetWindowTextW(hwnd, buffer, len(buffer))
+        entries.append((gw.Win32Window(hwnd), buffer.value, hwnd))
+    return entries
+
+
+def _enum_windows() -> List[Tuple[Any, str, str, Optional[int]]]:
+    """List top-level windows as (window, title, lowercased title, native handle)."""
+    if sys.platform == "win32":
+        rows = _enum_windows_native()
+    else:
+        import pygetwindow as gw
+        rows = [(window, window.title, None) for window in gw.getAllWindows()]
+    # Lowercase each title once per listing rather than once per comparison
+    return [(window, title, title.lower(), hwnd) for window, title, hwnd in rows]
+
+
+def _refresh():
+    """Re-enumerate windows if the cached listing has expired. Call with _lock held."""
+    now = time.monotonic()
+    if now - _cache["ts"] > WINDOW_CACHE_TTL:
+        _cache["entries"] = _enum_windows()
+        _cache["matches"] = {}
+        _cache["ts"] = now
+
+
+def find_windows(title_pattern: str) -> List[Any]:
+    """Return windows whose title contains the pattern.
+
+    Case-sensitive matches are preferred; if there are none, the match is
+    retried ignoring case. Results are memoized for the life of the listing.
+    """
+    with _lock:
+        _refresh()
+        matches = _cache["matches"].get(title_pattern)
+        if matches is None:
+            entries = _cache["entries"]
+            matches = [w for w, title, _, _ in entries if title_pattern in title]
+            if not matches:
+                pattern = title_pattern.lower()
+                matches = [w for w, _, lower, _ in entries if pattern in lower]
+            _cache["matches"][title_pattern] = matches
+        return list(matches)
+
+
+def describe_windows() -> List[Dict[str, Any]]:
+    """Return the title, position, size and active state of visible, titled windows.
+
+    On Windows each window costs one GetWindowRect call, and the foreground
+    window is fetched once for the whole listing; pygetwindow would make a
+    separate native call for every property of every window.
+    """
+    with _lock:
+        _refresh()
+        entries = list(_cache["entries"])
+
+    if sys.platform != "win32":
+        return [
+            {
+                "title": title,
+                "position": (window.left, window.top),
+                "size": (window.width, window.height),
+                "is_active": window.isActive
+            }
+            for window, title, _, _ in entries
+            if window.visible and title.strip()
+        ]
+
+    foreground = _user32.GetForegroundWindow()
+    rect = wintypes.RECT()
+    windows = []
+    for _, title, _, hwnd in entries:
+        if not title.strip() or not _user32.GetWindowRect(hwnd, ctypes.byref(rect)):
+            continue
+        windows.append({
+            "title": title,
+            "position": (rect.left, rect.top),
+            "size": (rect.right - rect.left, rect.bottom - rect.top),
+            "is_active": hwnd == foreground
+        })
+    return windows
+
+
+def wait_until_active(window: Any, timeout: float = 0.5, poll: float = 0.025) -> bool:
+    """Poll until the window reports itself active, for at most `timeout` seconds."""
+    deadline = time.monotonic() + timeout
+    while not window.isActive:
+        if time.monotonic() >= deadline:
+            return False
+        time.sleep(poll)
+    return True